@@ -7,11 +7,36 @@ from typing import List, Optional
 class Settings(BaseSettings):
     app_name: str = "Smart Notes"
     database_url: str = Field(..., alias="DATABASE_URL")
+    database_read_url: str | None = Field(None, alias="DATABASE_READ_URL")
+    read_your_writes_seconds: float = Field(5, alias="READ_YOUR_WRITES_SECONDS")
+    db_pool_size: int = Field(10, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(20, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout_seconds: float = Field(10, alias="DB_POOL_TIMEOUT_SECONDS")
+    db_pool_recycle_seconds: int = Field(1800, alias="DB_POOL_RECYCLE_SECONDS")
+    db_pool_pre_ping: bool = Field(True, alias="DB_POOL_PRE_PING")
+    db_pgbouncer: bool = Field(False, alias="DB_PGBOUNCER")
     jwt_secret_key: str = Field(..., alias="JWT_SECRET_KEY")
     jwt_algorithm: str = Field("HS256", alias="JWT_ALGORITHM")
     access_token_expire_minutes: int = Field(60 * 24, alias="ACCESS_TOKEN_EXPIRE_MINUTES")
+    user_cache_ttl_seconds: int = Field(60, alias="USER_CACHE_TTL_SECONDS")
+    user_cache_max_size: int = Field(10000, alias="USER_CACHE_MAX_SIZE")
+    password_hash_workers: int = Field(2, alias="PASSWORD_HASH_WORKERS")
+    password_hash_max_pending: int = Field(64, alias="PASSWORD_HASH_MAX_PENDING")
     cors_origins_raw: str | None = Field(None, alias="CORS_ORIGINS", exclude=True)
+    search_language: str = Field("simple", alias="SEARCH_LANGUAGE", pattern=r"^[a-z_]+$")
+    search_suggest_timeout_ms: int = Field(150, alias="SEARCH_SUGGEST_TIMEOUT_MS")
+    import_batch_size: int = Field(500, alias="IMPORT_BATCH_SIZE")
     reminder_enabled: bool = Field(False, alias="REMINDER_ENABLED")
+    reminder_batch_size: int = Field(200, alias="REMINDER_BATCH_SIZE")
+    reminder_concurrency: int = Field(8, alias="REMINDER_CONCURRENCY")
+    reminder_lease_seconds: int = Field(300, alias="REMINDER_LEASE_SECONDS")
+    reminder_reconcile_seconds: int = Field(60, alias="REMINDER_RECONCILE_SECONDS")
+    reminder_window_seconds: int = Field(3600, alias="REMINDER_WINDOW_SECONDS")
+    reminder_window_max_items: int = Field(10000, alias="REMINDER_WINDOW_MAX_ITEMS")
+    trash_retention_days: int = Field(30, alias="TRASH_RETENTION_DAYS")
+    trash_purge_enabled: bool = Field(True, alias="TRASH_PURGE_ENABLED")
+    trash_purge_interval_seconds: int = Field(3600, alias="TRASH_PURGE_INTERVAL_SECONDS")
+    trash_purge_batch_size: int = Field(500, alias="TRASH_PURGE_BATCH_SIZE")
     smtp_host: str | None = Field(None, alias="SMTP_HOST")
     smtp_port: int | None = Field(None, alias="SMTP_PORT")
     smtp_user: str | None = Field(None, alias="SMTP_USER")
@@ -19,10 +44,24 @@ class Settings(BaseSettings):
     smtp_from: str | None = Field(None, alias="SMTP_FROM")
     smtp_use_tls: bool = Field(True, alias="SMTP_USE_TLS")
     smtp_use_ssl: bool = Field(False, alias="SMTP_USE_SSL")
+    smtp_pool_size: int = Field(2, alias="SMTP_POOL_SIZE")
+    smtp_timeout_seconds: float = Field(30, alias="SMTP_TIMEOUT_SECONDS")
+    email_outbox_concurrency: int = Field(4, alias="EMAIL_OUTBOX_CONCURRENCY")
+    email_outbox_batch_size: int = Field(50, alias="EMAIL_OUTBOX_BATCH_SIZE")
+    email_outbox_max_attempts: int = Field(5, alias="EMAIL_OUTBOX_MAX_ATTEMPTS")
+    email_outbox_backoff_seconds: float = Field(30, alias="EMAIL_OUTBOX_BACKOFF_SECONDS")
+    email_outbox_poll_seconds: float = Field(5, alias="EMAIL_OUTBOX_POLL_SECONDS")
     aws_access_key_id: Optional[str] = Field(None, alias="AWS_ACCESS_KEY_ID")
     aws_secret_access_key: Optional[str] = Field(None, alias="AWS_SECRET_ACCESS_KEY")
     aws_region: Optional[str] = Field(None, alias="AWS_REGION")
     s3_bucket: Optional[str] = Field(None, alias="S3_BUCKET")
+    s3_endpoint_url: Optional[str] = Field(None, alias="S3_ENDPOINT_URL")
+    upload_max_bytes: int = Field(10 * 1024 * 1024, alias="UPLOAD_MAX_BYTES")
+    upload_presign_expires_seconds: int = Field(300, alias="UPLOAD_PRESIGN_EXPIRES_SECONDS")
+    image_workers: int = Field(2, alias="IMAGE_WORKERS")
+    public_share_cache_ttl_seconds: float = Field(300, alias="PUBLIC_SHARE_CACHE_TTL_SECONDS")
+    public_share_cache_max_size: int = Field(1000, alias="PUBLIC_SHARE_CACHE_MAX_SIZE")
+    public_share_max_age_seconds: int = Field(60, alias="PUBLIC_SHARE_MAX_AGE_SECONDS")
 
     @field_validator('smtp_port', mode='before')
     @classmethod
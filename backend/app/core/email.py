@@ -1,16 +1,165 @@
 """
 Service gửi email thông báo
 """
-import smtplib
+import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from email.message import Message
+from typing import List, Optional, Tuple
 import logging
 
+import aiosmtplib
+
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Lỗi kết nối: bỏ kết nối hỏng và thử lại một lần với kết nối mới
+_RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class SMTPConnectionPool:
+    """
+    Pool nhỏ các kết nối SMTP async đã đăng nhập, dùng lại giữa các email
+
+    Tối đa `size` email được gửi song song; kết nối rảnh được giữ lại cho lần sau,
+    kết nối bị server đóng sẽ được mở lại tự động.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str,
+        password: str,
+        use_ssl: bool = False,
+        start_tls: bool = True,
+        size: int = 2,
+        timeout: float = 30,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.start_tls = start_tls and not use_ssl
+        self.size = size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[aiosmtplib.SMTP] = []
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_ssl,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await client.connect()
+        await client.login(self.username, self.password)
+        return client
+
+    @staticmethod
+    async def _discard(client: Optional[aiosmtplib.SMTP]) -> None:
+        if client is None:
+            return
+        try:
+            if client.is_connected:
+                await client.quit()
+        except Exception:
+            client.close()
+
+    async def send(self, message: Message) -> None:
+        async with self._slots:
+            client = self._idle.pop() if self._idle else None
+            for attempt in range(2):
+                try:
+                    if client is None or not client.is_connected:
+                        client = await self._connect()
+                    await client.send_message(message)
+                except _RECONNECT_ERRORS:
+                    await self._discard(client)
+                    client = None
+                    if attempt:
+                        raise
+                    continue
+                except Exception:
+                    await self._discard(client)
+                    raise
+                self._idle.append(client)
+                return
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for client in idle:
+            await self._discard(client)
+
+
+_smtp_pool: Optional[SMTPConnectionPool] = None
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Pool dùng chung cho cả app, khởi tạo từ cấu hình SMTP ở lần gửi đầu tiên"""
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPConnectionPool(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            username=settings.smtp_user,
+            password=settings.smtp_password,
+            use_ssl=settings.smtp_use_ssl,
+            start_tls=settings.smtp_use_tls,
+            size=settings.smtp_pool_size,
+            timeout=settings.smtp_timeout_seconds,
+        )
+    return _smtp_pool
+
+
+async def close_smtp_pool() -> None:
+    global _smtp_pool
+    if _smtp_pool is not None:
+        await _smtp_pool.close()
+        _smtp_pool = None
+
+
+def smtp_configured() -> bool:
+    return all([settings.smtp_host, settings.smtp_port, settings.smtp_user, settings.smtp_password])
+
+
+def build_message(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> Message:
+    """Tạo message multipart (text + HTML)"""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = settings.smtp_from or settings.smtp_user
+    msg["To"] = to_email
+    
+    # Thêm nội dung text và HTML
+    if text_content:
+        part1 = MIMEText(text_content, "plain", "utf-8")
+        msg.attach(part1)
+    
+    part2 = MIMEText(html_content, "html", "utf-8")
+    msg.attach(part2)
+    return msg
+
+
+async def deliver_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None
+) -> None:
+    """Gửi email qua pool SMTP, ném exception nếu lỗi (dùng cho outbox để retry)"""
+    if not smtp_configured():
+        raise RuntimeError("SMTP is not configured")
+    await get_smtp_pool().send(build_message(to_email, subject, html_content, text_content))
+
 
 async def send_email(
     to_email: str,
@@ -19,7 +168,7 @@ async def send_email(
     text_content: Optional[str] = None
 ) -> bool:
     """
-    Gửi email thông báo
+    Gửi email thông báo qua pool kết nối SMTP async
     
     Args:
         to_email: Email người nhận
@@ -31,45 +180,13 @@ async def send_email(
         True nếu gửi thành công, False nếu có lỗi
     """
     # Nếu không có cấu hình SMTP, chỉ log và return False
-    if not all([settings.smtp_host, settings.smtp_port, settings.smtp_user, settings.smtp_password]):
+    if not smtp_configured():
         logger.warning("SMTP không được cấu hình, bỏ qua gửi email")
         return False
     
     try:
-        # Tạo message
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = settings.smtp_from or settings.smtp_user
-        msg["To"] = to_email
-        
-        # Thêm nội dung text và HTML
-        if text_content:
-            part1 = MIMEText(text_content, "plain", "utf-8")
-            msg.attach(part1)
-        
-        part2 = MIMEText(html_content, "html", "utf-8")
-        msg.attach(part2)
-        
-        # Gửi email với cấu hình linh hoạt
-        if settings.smtp_use_ssl:
-            # Dùng SSL trực tiếp (như port 465)
-            server = smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port)
-        else:
-            # Dùng SMTP thường
-            server = smtplib.SMTP(settings.smtp_host, settings.smtp_port)
-        
-        try:
-            # Bật TLS nếu cần (STARTTLS)
-            if settings.smtp_use_tls and not settings.smtp_use_ssl:
-                server.starttls()
-            
-            # Đăng nhập
-            server.login(settings.smtp_user, settings.smtp_password)
-            
-            # Gửi email
-            server.send_message(msg)
-        finally:
-            server.quit()
+        # Gửi qua kết nối có sẵn trong pool (tự mở lại nếu server đã đóng)
+        await deliver_email(to_email, subject, html_content, text_content)
         
         logger.info(f"Đã gửi email thành công đến {to_email}")
         return True
@@ -79,16 +196,16 @@ async def send_email(
         return False
 
 
-async def send_welcome_email(email: str, username: str) -> bool:
+def render_welcome_email(email: str, username: str) -> Tuple[str, str, str]:
     """
-    Gửi email chào mừng khi đăng ký thành công
+    Tạo nội dung email chào mừng khi đăng ký thành công
     
     Args:
         email: Email người dùng
         username: Tên người dùng
     
     Returns:
-        True nếu gửi thành công
+        (subject, html_content, text_content)
     """
     subject = "Chào mừng đến với Chí Tường Smart!"
     
@@ -202,12 +319,22 @@ Trân trọng,
 Đội ngũ Chí Tường Smart
     """
     
-    return await send_email(email, subject, html_content, text_content)
+    return subject, html_content, text_content
 
 
-async def send_reminder_email(email: str, username: str, note_title: str, note_content: str, reminder_time) -> bool:
+async def send_welcome_email(email: str, username: str) -> bool:
     """
-    Gửi email nhắc nhở cho ghi chú
+    Gửi email chào mừng khi đăng ký thành công
+    
+    Returns:
+        True nếu gửi thành công
+    """
+    return await send_email(email, *render_welcome_email(email, username))
+
+
+def render_reminder_email(email: str, username: str, note_title: str, note_content: str, reminder_time) -> Tuple[str, str, str]:
+    """
+    Tạo nội dung email nhắc nhở cho ghi chú
     
     Args:
         email: Email người dùng
@@ -217,7 +344,7 @@ async def send_reminder_email(email: str, username: str, note_title: str, note_c
         reminder_time: Thời gian nhắc nhở (datetime)
     
     Returns:
-        True nếu gửi thành công
+        (subject, html_content, text_content)
     """
     
     # Format thời gian nhắc nhở
@@ -354,5 +481,14 @@ Trân trọng,
 Đội ngũ Chí Tường Smart
     """
     
-    return await send_email(email, subject, html_content, text_content)
+    return subject, html_content, text_content
+
 
+async def send_reminder_email(email: str, username: str, note_title: str, note_content: str, reminder_time) -> bool:
+    """
+    Gửi email nhắc nhở cho ghi chú
+    
+    Returns:
+        True nếu gửi thành công
+    """
+    return await send_email(email, *render_reminder_email(email, username, note_title, note_content, reminder_time))
@@ -0,0 +1,57 @@
+"""
+Giới hạn kích thước body của các route upload ngay trong lúc nhận, trước khi Starlette spool multipart ra đĩa
+"""
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+
+# Phần multipart bao quanh file (boundary, header của part, các field nhỏ khác)
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def upload_too_large_detail() -> str:
+    return f"Ảnh vượt quá giới hạn {settings.upload_max_bytes // (1024 * 1024)}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Trả 413 cho request upload vượt UPLOAD_MAX_BYTES (+ phần multipart) mà không đọc hết body
+
+    Content-Length khai báo quá lớn bị từ chối trước khi đọc byte nào; body stream (chunked hoặc khai báo
+    sai) bị cắt khi vượt giới hạn. Route vẫn kiểm tra kích thước file sau khi parse như lớp bảo vệ cuối.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.upload_max_bytes + MULTIPART_OVERHEAD_BYTES
+        declared = Headers(scope=scope).get("content-length")
+        if declared and declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"detail": upload_too_large_detail()}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI để HTTPException từ lúc đọc form đi thẳng tới exception handler (413)
+                    raise HTTPException(status_code=413, detail=upload_too_large_detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,41 @@
+"""
+Tiện ích phân trang theo keyset (cursor)
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Sequence
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    raise TypeError(f"Không mã hóa được {type(value).__name__} vào cursor")
+
+
+def _object_hook(obj: dict):
+    if "__dt__" in obj:
+        return datetime.fromisoformat(obj["__dt__"])
+    return obj
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Mã hóa bộ giá trị sort key của dòng cuối thành cursor dạng chuỗi an toàn cho URL"""
+    raw = json.dumps(list(values), default=_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Giải mã cursor, trả về danh sách đúng `size` giá trị"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")), object_hook=_object_hook)
+    except (ValueError, UnicodeError) as exc:
+        raise InvalidCursor("Cursor không hợp lệ") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Cursor không hợp lệ")
+    return values
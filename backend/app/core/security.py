@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -8,6 +10,16 @@ from .config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt nha GIL khi bam, nen thread pool du de dua viec bam ra khoi event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+_password_pending = 0
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Hang doi bam mat khau da day"""
+
 
 # xac thuc password
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -19,10 +31,37 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# chay ham bam trong thread pool, gioi han so viec dang cho
+async def _run_password_job(func, *args):
+    global _password_pending
+    if _password_pending >= settings.password_hash_max_pending:
+        raise PasswordHasherBusy("Password hashing queue is full")
+    _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+
+# xac thuc password (khong block event loop)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+# hash password (khong block event loop)
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
 # tao JWT token
-def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(
+    subject: str, expires_delta: Optional[timedelta] = None, user_id: Optional[int] = None
+) -> str:
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
     to_encode = {"sub": subject, "exp": expire}
+    if user_id is not None:
+        to_encode["uid"] = user_id
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
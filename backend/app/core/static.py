@@ -0,0 +1,180 @@
+"""
+Phục vụ file trong /uploads: cache vĩnh viễn (immutable), ETag mạnh, 304 và Range (206)
+
+File upload được đặt tên ngẫu nhiên hoặc theo sha256 nội dung và không bao giờ bị ghi đè,
+nên trình duyệt/CDN có thể cache mãi mãi mà không cần hỏi lại server.
+"""
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Chỉ các loại ảnh này được phục vụ inline; file khác (vd. upload cũ đặt đuôi theo tên file của client) tải về
+_INLINE_TYPES = frozenset({"image/jpeg", "image/png", "image/gif", "image/webp"})
+# Tên file do hệ thống đặt: uuid4().hex hoặc sha256 (kèm hậu tố bản thu nhỏ)
+_GENERATED_NAME = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{64}(?:_[a-z]+)?)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+ByteRange = Tuple[int, int]
+
+
+def _parse_range(header: str, size: int) -> Optional[ByteRange]:
+    """
+    Một khoảng byte (start, end) đã chuẩn hóa; None nếu bỏ qua header (nhiều khoảng/sai cú pháp, vd. bytes=5-3)
+
+    Raises:
+        ValueError: Khoảng nằm ngoài file hoặc file rỗng (416)
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if start and end and int(end) < int(start):
+        # RFC 9110: last-pos < first-pos là range-spec không hợp lệ -> bỏ qua Range, trả 200
+        return None
+    if size == 0:
+        raise ValueError("empty representation")
+    if not start:
+        # bytes=-N: N byte cuối
+        length = int(end)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    first = int(start)
+    if first >= size:
+        raise ValueError("range not satisfiable")
+    return first, min(int(end), size - 1) if end else size - 1
+
+
+class UploadFileResponse(FileResponse):
+    """
+    FileResponse gửi một khoảng byte (206) nếu có byte_range
+
+    Dùng zero-copy của ASGI server khi có (extension http.response.pathsend / zerocopysend),
+    nếu không thì đọc file theo từng chunk trong thread.
+    """
+
+    def __init__(self, *args, byte_range: Optional[ByteRange] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.byte_range = byte_range
+        if byte_range is not None:
+            start, end = byte_range
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.stat_result.st_size}"
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        size = self.stat_result.st_size
+        start, end = self.byte_range if self.byte_range is not None else (0, size - 1)
+        if self.byte_range is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+        remaining = end - start + 1
+        if "http.response.zerocopysend" in extensions and remaining > 0:
+            with open(self.path, "rb") as file:
+                await send(
+                    {"type": "http.response.zerocopysend", "file": file.fileno(), "offset": start, "count": remaining}
+                )
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        # Luôn kết thúc response, kể cả file rỗng hoặc file bị cắt ngắn giữa chừng
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class UploadsStaticFiles(StaticFiles):
+    """StaticFiles cho thư mục uploads: Cache-Control immutable, ETag theo tên file, hỗ trợ Range"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        name = os.path.basename(path)
+        if name.startswith(".") or name.endswith(".part"):
+            # File tạm đang ghi dở: không phục vụ (nếu không sẽ bị cache immutable với nội dung chưa đủ)
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        # nosniff: trình duyệt không đoán lại nội dung (ảnh giả chứa HTML/script) thành trang web
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+            "x-content-type-options": "nosniff",
+        }
+        media_type = mimetypes.guess_type(full_path)[0]
+        if media_type not in _INLINE_TYPES:
+            media_type = "application/octet-stream"
+            headers["content-disposition"] = "attachment"
+        stem = os.path.splitext(os.path.basename(full_path))[0]
+        if _GENERATED_NAME.match(stem):
+            # Nội dung của tên file này không bao giờ đổi nên tên file (kèm kích thước) là ETag mạnh
+            headers["etag"] = f'"{stem}-{stat_result.st_size:x}"'
+
+        response = UploadFileResponse(
+            full_path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if range_header is None or not self._if_range_matches(response.headers, request_headers):
+            return response
+        try:
+            byte_range = _parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={
+                    "accept-ranges": "bytes",
+                    "content-range": f"bytes */{stat_result.st_size}",
+                    "x-content-type-options": "nosniff",
+                },
+            )
+        if byte_range is None:
+            return response
+        return UploadFileResponse(
+            full_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+            byte_range=byte_range,
+        )
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        """If-None-Match được ưu tiên; chỉ xét If-Modified-Since khi client không gửi ETag"""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = response_headers.get("etag")
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        return super().is_not_modified(response_headers, request_headers)
+
+    @staticmethod
+    def _if_range_matches(response_headers: Headers, request_headers: Headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range in (response_headers.get("etag"), response_headers.get("last-modified"))
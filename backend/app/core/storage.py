@@ -1,13 +1,37 @@
+import asyncio
+import hashlib
+import hmac
 import os
-from io import BytesIO
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Optional
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
-from botocore.exceptions import BotoCoreError, NoCredentialsError
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
 
 from .config import settings
+from .static import IMMUTABLE_CACHE_CONTROL
 
+# Thư mục lưu ảnh khi không dùng S3 (được mount ở /uploads)
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "uploads")
 
+# S3: client chỉ được ký để ghi vào incoming/; ảnh được chép sang uploads/ (bất biến) khi complete
+_INCOMING_PREFIX = "incoming/"
+
+# Upload nhiều phần (multipart) theo từng chunk 8MB, tối đa 4 phần song song cho mỗi file
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+
+@lru_cache(maxsize=1)
 def _get_s3_client():
+    """Client boto3 dùng chung cho mọi request (thread-safe), tạo ở lần gọi đầu tiên"""
     if not settings.s3_enabled:
         return None
     return boto3.client(
@@ -15,35 +39,156 @@ def _get_s3_client():
         region_name=settings.aws_region,
         aws_access_key_id=settings.aws_access_key_id,
         aws_secret_access_key=settings.aws_secret_access_key,
-        config=Config(signature_version="s3v4"),
+        endpoint_url=settings.s3_endpoint_url,
+        config=Config(signature_version="s3v4", max_pool_connections=32),
     )
 
 
-async def upload_image_to_s3(file_obj, filename: str, content_type: str) -> str:
+def upload_size(file_obj) -> int:
+    """Kích thước file đã upload (UploadFile), không đọc nội dung vào bộ nhớ"""
+    if file_obj.size is not None:
+        return file_obj.size
+    position = file_obj.file.tell()
+    size = file_obj.file.seek(0, os.SEEK_END)
+    file_obj.file.seek(position)
+    return size
+
+
+def s3_object_url(key: str) -> str:
+    bucket = settings.s3_bucket
+    if settings.s3_endpoint_url:
+        # S3-compatible (MinIO, LocalStack, ...): path-style URL
+        return f"{settings.s3_endpoint_url.rstrip('/')}/{bucket}/{key}"
+    # Standard S3 URL format
+    return f"https://{bucket}.s3.{settings.aws_region}.amazonaws.com/{key}"
+
+
+def presign_s3_upload(filename: str, content_type: str, max_bytes: int, expires_in: int) -> dict:
     """
-    Upload a file-like object to S3 and return the public URL.
-    Assumes bucket is private/public; URL points to S3 object path.
+    Presigned POST vào incoming/: S3 tự kiểm tra Content-Type và kích thước (content-length-range)
+
+    Form presigned dùng lại được tới khi hết hạn, nên không bao giờ ký cho key trong uploads/.
     """
     client = _get_s3_client()
     if not client:
         raise RuntimeError("S3 is not configured")
+    try:
+        return client.generate_presigned_post(
+            settings.s3_bucket,
+            f"{_INCOMING_PREFIX}{filename}",
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+            ExpiresIn=expires_in,
+        )
+    except (BotoCoreError, ClientError) as exc:
+        raise RuntimeError(f"S3 presign failed: {exc}") from exc
 
-    data = await file_obj.read()
-    buffer = BytesIO(data)
 
-    key = f"uploads/{filename}"
+async def stored_s3_object(filename: str) -> Optional[dict]:
+    """Metadata (ContentLength, ContentType) của ảnh đã upload lên S3, None nếu chưa có"""
+    client = _get_s3_client()
+    if not client:
+        raise RuntimeError("S3 is not configured")
     try:
-        client.upload_fileobj(
-            buffer,
-            settings.s3_bucket,
-            key,
-            ExtraArgs={"ContentType": content_type},
+        return await asyncio.to_thread(client.head_object, Bucket=settings.s3_bucket, Key=f"uploads/{filename}")
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise RuntimeError(f"S3 head_object failed: {exc}") from exc
+
+
+async def promote_s3_upload(filename: str, content_type: str) -> Optional[int]:
+    """
+    Chép ảnh client đã upload từ incoming/ sang uploads/ (key client không ghi được), trả về kích thước
+
+    Chép đúng phiên bản vừa HEAD (CopySourceIfMatch) để kích thước trả về khớp nội dung được chép.
+    None nếu client chưa upload.
+    """
+    client = _get_s3_client()
+    if not client:
+        raise RuntimeError("S3 is not configured")
+    source_key = f"{_INCOMING_PREFIX}{filename}"
+    try:
+        try:
+            head = await asyncio.to_thread(client.head_object, Bucket=settings.s3_bucket, Key=source_key)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        await asyncio.to_thread(
+            client.copy_object,
+            Bucket=settings.s3_bucket,
+            Key=f"uploads/{filename}",
+            CopySource={"Bucket": settings.s3_bucket, "Key": source_key},
+            CopySourceIfMatch=head["ETag"],
+            MetadataDirective="REPLACE",
+            ContentType=content_type,
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
         )
-    except (BotoCoreError, NoCredentialsError) as exc:
-        raise RuntimeError(f"S3 upload failed: {exc}") from exc
+        await asyncio.to_thread(client.delete_object, Bucket=settings.s3_bucket, Key=source_key)
+    except (BotoCoreError, ClientError) as exc:
+        raise RuntimeError(f"S3 promote upload failed: {exc}") from exc
+    return head["ContentLength"]
+
+
+def sign_local_upload(filename: str, content_type: str, max_bytes: int, expires: int) -> str:
+    """Chữ ký HMAC cho URL upload vào thư mục local (chế độ dev / không có S3)"""
+    message = f"{filename}\n{content_type}\n{max_bytes}\n{expires}".encode()
+    return hmac.new(settings.jwt_secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_upload(filename: str, content_type: str, max_bytes: int, expires: int, signature: str) -> bool:
+    expected = sign_local_upload(filename, content_type, max_bytes, expires)
+    return hmac.compare_digest(expected, signature)
+
+
+def stored_file_url(filename: str) -> str:
+    """URL công khai của ảnh đã lưu (S3 hoặc thư mục /uploads)"""
+    return s3_object_url(f"uploads/{filename}") if settings.s3_enabled else f"/uploads/{filename}"
+
+
+async def stored_file_exists(filename: str) -> bool:
+    if settings.s3_enabled:
+        return await stored_s3_object(filename) is not None
+    return await asyncio.to_thread(os.path.exists, os.path.join(UPLOADS_DIR, filename))
 
-    region = settings.aws_region
-    bucket = settings.s3_bucket
-    # Standard S3 URL format
-    return f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
 
+def _write_local_file(filename: str, fileobj) -> None:
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    path = os.path.join(UPLOADS_DIR, filename)
+    # Tên file tạm riêng cho mỗi lần ghi: hai upload cùng một ảnh (cùng tên sha256) có thể chạy song song
+    with tempfile.NamedTemporaryFile(dir=UPLOADS_DIR, prefix=f".{filename}.", suffix=".part", delete=False) as f:
+        partial_path = f.name
+        try:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        except BaseException:
+            f.close()
+            os.remove(partial_path)
+            raise
+    os.chmod(partial_path, 0o644)
+    os.replace(partial_path, path)
+
+
+async def save_file(filename: str, fileobj, content_type: str) -> str:
+    """
+    Lưu file (file-like, đọc từ vị trí hiện tại) lên S3 hoặc thư mục uploads, trả về URL
+
+    Chạy trong worker thread và upload S3 theo từng phần (multipart), không nạp cả file vào bộ nhớ.
+    """
+    if not settings.s3_enabled:
+        await asyncio.to_thread(_write_local_file, filename, fileobj)
+        return stored_file_url(filename)
+
+    client = _get_s3_client()
+    try:
+        await asyncio.to_thread(
+            client.upload_fileobj,
+            fileobj,
+            settings.s3_bucket,
+            f"uploads/{filename}",
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+            Config=_TRANSFER_CONFIG,
+        )
+    except (BotoCoreError, ClientError, NoCredentialsError, S3UploadFailedError) as exc:
+        raise RuntimeError(f"S3 upload failed: {exc}") from exc
+    return stored_file_url(filename)
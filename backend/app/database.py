@@ -1,13 +1,85 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .core.config import settings
 
-engine = create_async_engine(settings.database_url, echo=False, future=True)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Pool của async engine, đo thêm thời gian chờ lấy connection (gồm cả lúc mở connection mới)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def _engine_options() -> dict:
+    options = dict(
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if settings.db_pgbouncer:
+        # PgBouncer (transaction pooling) không giữ prepared statement giữa các transaction
+        options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    return options
+
+
+engine = create_async_engine(settings.database_url, echo=False, future=True, **_engine_options())
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Read replica cho các route chỉ đọc; không cấu hình DATABASE_READ_URL thì dùng chung primary
+read_engine = (
+    create_async_engine(settings.database_read_url, echo=False, future=True, **_engine_options())
+    if settings.database_read_url
+    else engine
+)
+ReadSessionLocal = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 
+def pool_metrics(async_engine: AsyncEngine = engine) -> dict:
+    """Số liệu hiện tại của connection pool (cho /metrics)"""
+    pool: TimedQueuePool = async_engine.pool
+    checkouts = pool.checkouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "timeouts": pool.timeouts,
+        "avg_wait_ms": round(pool.wait_seconds_total / checkouts * 1000, 3) if checkouts else 0.0,
+        "max_wait_ms": round(pool.wait_seconds_max * 1000, 3),
+    }
+
+
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
 
+
+async def get_read_session() -> AsyncSession:
+    """Session chỉ đọc trên replica (có thể trễ vài giây so với primary)"""
+    async with ReadSessionLocal() as session:
+        yield session
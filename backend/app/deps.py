@@ -1,19 +1,75 @@
-from fastapi import Depends, HTTPException, status
+import time
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.datastructures import MutableHeaders
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from .core.cache import TTLCache
 from .core.config import settings
-from .database import get_session
+from .database import AsyncSessionLocal, ReadSessionLocal, get_session
 from .models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# cache user da xac thuc theo token subject (email)
+user_cache = TTLCache(maxsize=settings.user_cache_max_size, ttl=settings.user_cache_ttl_seconds)
+
+# thoi diem ghi cuoi cung cua client (unix timestamp), gui kem response sau moi lan ghi va client gui lai
+# o cac request sau; nam o client nen dung voi moi process/instance, khong phu thuoc worker nao nhan request
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "last_write"
+
+
+# xoa user khoi cache khi thong tin user thay doi
+def invalidate_user(email: str) -> None:
+    user_cache.pop(email)
+
+
+def wrote_recently(request: Request) -> bool:
+    """Client vua ghi trong READ_YOUR_WRITES_SECONDS giay (theo header X-Last-Write hoac cookie last_write)"""
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        last_write = float(value)
+    except (TypeError, ValueError):
+        return False
+    # chap nhan lech dong ho giua cac instance trong cung cua so
+    return abs(time.time() - last_write) <= settings.read_your_writes_seconds
+
+
+class ReadYourWritesMiddleware:
+    """Gan thoi diem ghi (header + cookie) khi user gui request khong phai GET/HEAD/OPTIONS thanh cong"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                user_id = scope.get("state", {}).get("user_id")
+                if user_id is not None:
+                    last_write = f"{time.time():.3f}"
+                    headers = MutableHeaders(scope=message)
+                    headers[LAST_WRITE_HEADER] = last_write
+                    headers.append(
+                        "set-cookie",
+                        f"{LAST_WRITE_COOKIE}={last_write}; Max-Age={int(settings.read_your_writes_seconds) + 1}; "
+                        "Path=/; HttpOnly; SameSite=Lax",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
 
 # xac thuc token va lay user hien tai
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
+    request: Request, token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -28,9 +84,31 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    result = await session.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+    user = user_cache.get(email)
+    if user is not None:
+        request.state.user_id = user.id
+        return user
+
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        user = await session.get(User, user_id)
+        if user and user.email != email:
+            user = None
+    else:
+        result = await session.execute(select(User).where(User.email == email))
+        user = result.scalar_one_or_none()
     if not user:
         raise credentials_exception
+
+    # tach user khoi session de co the dung lai an toan o cac request sau
+    session.expunge(user)
+    user_cache.set(email, user)
+    request.state.user_id = user.id
     return user
 
+
+# session cho route chi doc: replica, tru khi client vua ghi (read-your-writes)
+async def get_user_read_session(request: Request) -> AsyncSession:
+    session_factory = AsyncSessionLocal if wrote_recently(request) else ReadSessionLocal
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,173 @@
+"""
+Xử lý ảnh upload: đặt tên theo sha256 nội dung (trùng ảnh thì dùng lại) và tạo các bản thu nhỏ WebP
+
+Resize chạy trong process pool để không chiếm event loop/GIL của worker API. Process con nhận đường dẫn
+file tạm chứ không nhận bytes, nên ảnh không bị nạp vào bộ nhớ của worker API.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from .core.config import settings
+from .core.storage import save_file, stored_file_exists, stored_file_url
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tên bản thu nhỏ -> cạnh dài tối đa (px)
+IMAGE_VARIANTS = {"thumb": 320, "medium": 1280}
+_WEBP_QUALITY = 80
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Định dạng ảnh được nhận: content type -> phần mở rộng của file lưu (không lấy theo tên file của client)
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+_PIL_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+# URL ảnh gốc đã qua pipeline: .../<sha256>.<ext>
+_HASHED_URL = re.compile(r"^(?P<prefix>.*/)(?P<digest>[0-9a-f]{64})\.[a-z0-9]+$")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn thay cho fork mặc định: fork một process đa luồng (thread pool bcrypt, to_thread) có thể deadlock
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.image_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_image_workers() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _render_variants(path: str) -> Dict[str, bytes]:
+    """Chạy trong process con: giải mã ảnh từ file và tạo các bản WebP theo IMAGE_VARIANTS"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path, formats=_PIL_FORMATS) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+            variants = {}
+            for name, max_side in IMAGE_VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, "WEBP", quality=_WEBP_QUALITY, method=4)
+                variants[name] = buffer.getvalue()
+            return variants
+    except Exception as exc:
+        # Exception của Pillow có thể không pickle được qua process pool
+        raise InvalidImage(str(exc)) from None
+
+
+def _sha256(fileobj) -> str:
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    while chunk := fileobj.read(_HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def _sniff_content_type(fileobj) -> Optional[str]:
+    """Content type theo magic bytes đầu file, None nếu không thuộc IMAGE_TYPES"""
+    fileobj.seek(0)
+    head = fileobj.read(12)
+    fileobj.seek(0)
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _copy_to_temp_file(fileobj) -> str:
+    """Chép upload (SpooledTemporaryFile, có thể chỉ nằm trong RAM) ra file tạm có đường dẫn cho process con"""
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="smartnotes-image-", delete=False) as tmp:
+        while chunk := fileobj.read(_HASH_CHUNK_SIZE):
+            tmp.write(chunk)
+    fileobj.seek(0)
+    return tmp.name
+
+
+async def _render_in_pool(path: str) -> Dict[str, bytes]:
+    executor = _get_executor()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, _render_variants, path)
+    except BrokenProcessPool:
+        # Process con chết (OOM, crash trong thư viện ảnh): bỏ pool hỏng để lần upload sau tạo pool mới
+        logger.error("❌ Process pool xử lý ảnh bị hỏng, sẽ tạo lại ở lần upload sau")
+        if _executor is executor:
+            shutdown_image_workers()
+        raise
+
+
+def variant_filename(digest: str, name: str) -> str:
+    return f"{digest}_{name}.webp"
+
+
+def image_variant_urls(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL các bản thu nhỏ của một ảnh đã qua pipeline (None nếu ảnh từ nguồn khác)"""
+    match = _HASHED_URL.match(image_url or "")
+    if not match:
+        return None
+    return {
+        name: f"{match['prefix']}{variant_filename(match['digest'], name)}" for name in IMAGE_VARIANTS
+    }
+
+
+async def store_image(upload) -> dict:
+    """
+    Lưu ảnh upload kèm các bản thu nhỏ, trả về {"url", "variants"}
+
+    Ảnh gốc được ghi sau cùng nên có ảnh gốc nghĩa là đã đủ bản thu nhỏ; upload lại cùng nội dung
+    chỉ tốn một lần hash và một lần kiểm tra tồn tại. Tên file là <sha256><ext> với ext theo định dạng
+    thật của ảnh, nên cùng nội dung luôn cùng một file và URL luôn khớp _HASHED_URL.
+    """
+    content_type = await asyncio.to_thread(_sniff_content_type, upload.file)
+    if content_type is None:
+        raise InvalidImage("Định dạng ảnh không được hỗ trợ")
+    digest = await asyncio.to_thread(_sha256, upload.file)
+    filename = f"{digest}{IMAGE_TYPES[content_type]}"
+    if await stored_file_exists(filename):
+        url = stored_file_url(filename)
+        return {"url": url, "variants": image_variant_urls(url)}
+
+    path = await asyncio.to_thread(_copy_to_temp_file, upload.file)
+    try:
+        variants = await _render_in_pool(path)
+    finally:
+        await asyncio.to_thread(os.remove, path)
+
+    await asyncio.gather(
+        *[
+            save_file(variant_filename(digest, name), io.BytesIO(content), "image/webp")
+            for name, content in variants.items()
+        ]
+    )
+    url = await save_file(filename, upload.file, content_type)
+    logger.info(f"🖼️  Đã lưu ảnh {filename} và {len(variants)} bản thu nhỏ")
+    return {"url": url, "variants": image_variant_urls(url)}
@@ -0,0 +1,325 @@
+"""
+Nhập ghi chú hàng loạt từ file NDJSON hoặc file zip chứa Markdown
+
+Đọc từng bản ghi một (bộ nhớ không phụ thuộc kích thước file), gom thành lô rồi INSERT nhiều dòng
+một lần; folder/tag được tra theo tên qua cache nạp sẵn, chỉ tạo mới khi chưa có.
+"""
+import asyncio
+import json
+import os
+import posixpath
+import time
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Folder, Note, NoteTag, Tag
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Số lỗi tối đa giữ lại trong báo cáo
+_MAX_REPORTED_ERRORS = 20
+_NDJSON_CHUNK_SIZE = 64 * 1024
+# File Markdown lớn hơn mức này trong zip bị bỏ qua (tránh zip bomb)
+_MAX_MARKDOWN_BYTES = 5 * 1024 * 1024
+# Một dòng NDJSON (một ghi chú) dài hơn mức này bị bỏ qua
+_MAX_NDJSON_LINE_BYTES = _MAX_MARKDOWN_BYTES
+
+FolderPath = Tuple[str, ...]
+# Một ghi chú cần nhập: title, content, is_markdown, is_pinned, color, folder, tags, created_at, updated_at
+ImportRecord = dict
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _folder_path(value) -> FolderPath:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split("/")
+    return tuple(str(part).strip()[:200] for part in value if str(part).strip())
+
+
+def _normalize(raw: dict) -> ImportRecord:
+    title = str(raw.get("title") or "").strip() or "Untitled"
+    tags = raw.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return dict(
+        title=title[:255],
+        content=str(raw.get("content") or ""),
+        is_markdown=bool(raw.get("is_markdown", True)),
+        is_pinned=bool(raw.get("is_pinned", False)),
+        color=(str(raw["color"])[:20] if raw.get("color") else "#ffffff"),
+        folder=_folder_path(raw.get("folder")),
+        tags=sorted({str(tag).strip()[:100] for tag in tags if str(tag).strip()}),
+        created_at=_parse_datetime(raw.get("created_at")),
+        updated_at=_parse_datetime(raw.get("updated_at")),
+    )
+
+
+def _parse_ndjson_line(line: bytes, line_no: int) -> Tuple[Optional[ImportRecord], Optional[str]]:
+    try:
+        raw = json.loads(line)
+        if not isinstance(raw, dict):
+            raise ValueError("expected a JSON object")
+        return _normalize(raw), None
+    except ValueError as exc:
+        return None, f"line {line_no}: {exc}"
+
+
+async def iter_ndjson(upload) -> AsyncIterator[Tuple[Optional[ImportRecord], Optional[str]]]:
+    """
+    Đọc file NDJSON (mỗi dòng một object) theo từng chunk, trả về (record, lỗi)
+
+    Dòng dài hơn _MAX_NDJSON_LINE_BYTES được báo lỗi và bỏ qua tới ký tự xuống dòng kế tiếp,
+    nên bộ nhớ bị chặn bởi độ dài một dòng chứ không phải kích thước file.
+    """
+    buffer = bytearray()
+    line_no = 0
+    # Đang bỏ qua phần còn lại của một dòng quá dài (đã báo lỗi)
+    skipping = False
+    while True:
+        chunk = await upload.read(_NDJSON_CHUNK_SIZE)
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            line_no += 1
+            piece = chunk[start:end]
+            start = end + 1
+            if skipping:
+                skipping = False
+                continue
+            buffer += piece
+            if len(buffer) > _MAX_NDJSON_LINE_BYTES:
+                buffer.clear()
+                yield None, f"line {line_no}: line too long"
+                continue
+            line = bytes(buffer)
+            buffer.clear()
+            if line.strip():
+                yield _parse_ndjson_line(line, line_no)
+
+        if not skipping:
+            buffer += chunk[start:]
+            if len(buffer) > _MAX_NDJSON_LINE_BYTES:
+                buffer.clear()
+                skipping = True
+                yield None, f"line {line_no + 1}: line too long"
+        if not chunk:
+            break
+
+    # Dòng cuối không có ký tự xuống dòng
+    if buffer.strip():
+        yield _parse_ndjson_line(bytes(buffer), line_no + 1)
+
+
+def _parse_markdown(path: str, text: str) -> ImportRecord:
+    """Markdown có thể mở đầu bằng front matter (title:, tags:); folder lấy theo thư mục trong zip"""
+    meta = {}
+    if text.startswith("---\n"):
+        end = text.find("\n---", 4)
+        if end != -1:
+            for line in text[4:end].splitlines():
+                key, sep, value = line.partition(":")
+                if sep:
+                    meta[key.strip().lower()] = value.strip()
+            text = text[end + 4:].lstrip("\n")
+    title = meta.get("title")
+    if not title:
+        first_line = text.split("\n", 1)[0]
+        if first_line.startswith("# "):
+            title = first_line[2:]
+        else:
+            title = os.path.splitext(posixpath.basename(path))[0]
+    tags = meta.get("tags", "").strip("[]")
+    return _normalize(
+        {
+            "title": title,
+            "content": text,
+            "is_markdown": True,
+            "folder": posixpath.dirname(path),
+            "tags": [tag.strip().strip("'\"") for tag in tags.split(",")],
+            "created_at": meta.get("created_at"),
+            "updated_at": meta.get("updated_at"),
+        }
+    )
+
+
+async def iter_markdown_zip(fileobj) -> AsyncIterator[Tuple[Optional[ImportRecord], Optional[str]]]:
+    """Đọc từng file .md trong zip (giải nén từng file trong thread, không nạp cả archive)"""
+    archive = await asyncio.to_thread(zipfile.ZipFile, fileobj)
+    try:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith((".md", ".markdown")):
+                continue
+            if posixpath.basename(info.filename).startswith("."):
+                continue
+            if info.file_size > _MAX_MARKDOWN_BYTES:
+                yield None, f"{info.filename}: file too large"
+                continue
+            try:
+                data = await asyncio.to_thread(archive.read, info)
+                yield _parse_markdown(info.filename, data.decode("utf-8", errors="replace")), None
+            except (zipfile.BadZipFile, OSError) as exc:
+                yield None, f"{info.filename}: {exc}"
+    finally:
+        archive.close()
+
+
+class NoteImporter:
+    """Ghi các ImportRecord theo lô cho một user, cache folder/tag theo tên"""
+
+    def __init__(self, session: AsyncSession, user_id: int):
+        self.session = session
+        self.user_id = user_id
+        self.folders: Dict[FolderPath, int] = {}
+        self.tags: Dict[str, int] = {}
+        self.notes_created = 0
+        self.folders_created = 0
+        self.tags_created = 0
+
+    async def load_existing(self) -> None:
+        """Nạp sẵn toàn bộ folder (theo đường dẫn) và tag của user bằng hai query"""
+        result = await self.session.execute(
+            select(Folder.id, Folder.name, Folder.parent_id).where(Folder.user_id == self.user_id)
+        )
+        rows = {row.id: row for row in result.all()}
+
+        def path_of(folder_id: int, depth: int = 0) -> FolderPath:
+            row = rows[folder_id]
+            if row.parent_id is None or row.parent_id not in rows or depth > 50:
+                return (row.name,)
+            return path_of(row.parent_id, depth + 1) + (row.name,)
+
+        for folder_id in rows:
+            self.folders.setdefault(path_of(folder_id), folder_id)
+
+        result = await self.session.execute(select(Tag.id, Tag.name).where(Tag.user_id == self.user_id))
+        self.tags = {name: tag_id for tag_id, name in result.all()}
+
+    async def _folder_id(self, path: FolderPath) -> Optional[int]:
+        if not path:
+            return None
+        folder_id = self.folders.get(path)
+        if folder_id is None:
+            parent_id = await self._folder_id(path[:-1])
+            folder_id = await self.session.scalar(
+                insert(Folder)
+                .values(name=path[-1], parent_id=parent_id, user_id=self.user_id)
+                .returning(Folder.id)
+            )
+            self.folders[path] = folder_id
+            self.folders_created += 1
+        return folder_id
+
+    async def _ensure_tags(self, names: set) -> None:
+        missing = sorted(names - self.tags.keys())
+        if not missing:
+            return
+        result = await self.session.execute(
+            pg_insert(Tag)
+            .values([{"name": name, "user_id": self.user_id} for name in missing])
+            .on_conflict_do_nothing(constraint="uq_tag_user")
+            .returning(Tag.id, Tag.name)
+        )
+        created = {name: tag_id for tag_id, name in result.all()}
+        self.tags_created += len(created)
+        self.tags.update(created)
+        if len(created) < len(missing):
+            # Tag được tạo song song bởi request khác
+            result = await self.session.execute(
+                select(Tag.id, Tag.name).where(Tag.user_id == self.user_id, Tag.name.in_(missing))
+            )
+            self.tags.update({name: tag_id for tag_id, name in result.all()})
+
+    async def write_batch(self, records: List[ImportRecord]) -> None:
+        """Một lô = một transaction: INSERT nhiều dòng notes (RETURNING id) rồi notes_tags"""
+        await self._ensure_tags({tag for record in records for tag in record["tags"]})
+        rows = []
+        for record in records:
+            row = {
+                "title": record["title"],
+                "content": record["content"],
+                "is_markdown": record["is_markdown"],
+                "is_pinned": record["is_pinned"],
+                "color": record["color"],
+                "folder_id": await self._folder_id(record["folder"]),
+                "user_id": self.user_id,
+            }
+            created_at = record["created_at"] or datetime.utcnow()
+            row["created_at"] = created_at
+            row["updated_at"] = record["updated_at"] or created_at
+            rows.append(row)
+
+        result = await self.session.execute(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows)
+        note_ids = result.scalars().all()
+        links = [
+            {"note_id": note_id, "tag_id": self.tags[tag]}
+            for note_id, record in zip(note_ids, records)
+            for tag in record["tags"]
+        ]
+        if links:
+            await self.session.execute(insert(NoteTag), links)
+        await self.session.commit()
+        self.notes_created += len(note_ids)
+
+
+async def import_notes(
+    session: AsyncSession,
+    user_id: int,
+    records: AsyncIterator[Tuple[Optional[ImportRecord], Optional[str]]],
+    batch_size: int,
+) -> dict:
+    """
+    Nhập toàn bộ bản ghi từ `records` cho user, commit theo từng lô `batch_size` ghi chú
+
+    Returns:
+        Báo cáo: số ghi chú/folder/tag đã tạo, số bản ghi lỗi, thời gian và tốc độ (rows/giây)
+    """
+    started = time.perf_counter()
+    importer = NoteImporter(session, user_id)
+    await importer.load_existing()
+
+    batch: List[ImportRecord] = []
+    errors: List[str] = []
+    skipped = 0
+    async for record, error in records:
+        if error is not None:
+            skipped += 1
+            if len(errors) < _MAX_REPORTED_ERRORS:
+                errors.append(error)
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await importer.write_batch(batch)
+            batch = []
+    if batch:
+        await importer.write_batch(batch)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "notes_created": importer.notes_created,
+        "folders_created": importer.folders_created,
+        "tags_created": importer.tags_created,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(importer.notes_created / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    logger.info(
+        f"📥 Import user {user_id}: {importer.notes_created} ghi chú trong {report['seconds']}s "
+        f"({report['rows_per_second']} rows/s), bỏ qua {skipped}"
+    )
+    return report
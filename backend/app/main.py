@@ -4,12 +4,21 @@ import contextlib
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from .core.config import settings
-from .database import Base, engine, AsyncSessionLocal
-from .routers import auth, folders, notes, search, share, tags
+from .database import Base, engine, read_engine, AsyncSessionLocal, pool_metrics
+from .migrations import create_extensions, run_migrations
+from .core.email import close_smtp_pool, smtp_configured
+from .core.limits import UploadSizeLimitMiddleware
+from .core.static import UploadsStaticFiles
+from .core.storage import UPLOADS_DIR
+from .images import shutdown_image_workers
+from .deps import LAST_WRITE_HEADER, ReadYourWritesMiddleware, user_cache
+from .routers import auth, files, folders, notes, search, share, tags
 from .reminder import reminder_worker
+from .purge import purge_worker
+from .outbox import outbox_dispatcher, outbox_metrics
+from .share_cache import public_share_cache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,23 +36,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LAST_WRITE_HEADER],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/notes/upload"])
 
-# Static files for uploads
-_current_dir = os.path.dirname(os.path.abspath(__file__))
-_backend_dir = os.path.dirname(_current_dir)
-uploads_dir = os.path.join(_backend_dir, "uploads")
-
-os.makedirs(uploads_dir, exist_ok=True)
-logger.info(f"📁 Uploads directory: {uploads_dir}")
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Static files for uploads (tên file không bao giờ đổi nội dung -> cache immutable)
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+logger.info(f"📁 Uploads directory: {UPLOADS_DIR}")
+app.mount("/uploads", UploadsStaticFiles(directory=UPLOADS_DIR), name="uploads")
 
 
 @app.on_event("startup")
 async def on_startup():
+    await create_extensions(engine)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
     
+    if settings.trash_purge_enabled:
+        app.state.purge_task = asyncio.create_task(purge_worker(AsyncSessionLocal))
+    else:
+        logger.warning("⚠️  TRASH_PURGE_ENABLED=false - Purge worker không chạy")
+
+    if smtp_configured():
+        app.state.outbox_task = asyncio.create_task(outbox_dispatcher(AsyncSessionLocal))
+    else:
+        logger.warning("⚠️  SMTP chưa cấu hình - Outbox dispatcher không chạy")
+
     if settings.reminder_enabled and settings.smtp_host:
         logger.info("✅ Reminder enabled - Khởi động reminder worker")
         app.state.reminder_task = asyncio.create_task(reminder_worker(AsyncSessionLocal))
@@ -59,19 +79,36 @@ async def health():
     return {"status": "ok", "app": settings.app_name}
 
 
+@app.get("/metrics")
+async def metrics():
+    pools = {"db_pool": pool_metrics()}
+    if read_engine is not engine:
+        pools["db_read_pool"] = pool_metrics(read_engine)
+    return {
+        **pools,
+        "user_cache": user_cache.stats(),
+        "public_share_cache": public_share_cache.stats(),
+        "email_outbox": outbox_metrics(),
+    }
+
+
 app.include_router(auth.router)
 app.include_router(folders.router)
 app.include_router(tags.router)
 app.include_router(notes.router)
 app.include_router(search.router)
 app.include_router(share.router)
+app.include_router(files.router)
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    task = getattr(app.state, "reminder_task", None)
-    if task:
-        task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await task
+    for name in ("reminder_task", "purge_task", "outbox_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    await close_smtp_pool()
+    shutdown_image_workers()
 
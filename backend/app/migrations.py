@@ -0,0 +1,176 @@
+"""
+Đồng bộ schema cho database đã tồn tại (create_all chỉ tạo bảng mới, không thêm cột/index)
+
+Mỗi bước phải idempotent vì được chạy lại ở mọi lần khởi động.
+"""
+from typing import Awaitable, Callable, List, Union
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex
+
+from .core.config import settings
+from .database import Base
+from .models import SEARCH_TEXT_CONFIG
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Khóa advisory để nhiều instance khởi động cùng lúc không chạy migration chồng nhau
+_MIGRATION_LOCK_KEY = 7_203_114
+
+# Extension mà models cần (index gin_trgm_ops, GIN nhiều cột có user_id), phải có trước create_all
+EXTENSIONS = ("pg_trgm", "btree_gin", "unaccent")
+
+MigrationStep = Union[str, Callable[[AsyncConnection], Awaitable[None]]]
+
+
+def ensure_index(table_name: str, index_name: str) -> Callable[[AsyncConnection], Awaitable[None]]:
+    """
+    Tạo index khai báo trong models bằng CREATE INDEX CONCURRENTLY (không khóa ghi bảng)
+
+    Index INVALID còn sót lại từ lần tạo CONCURRENTLY bị lỗi trước đó sẽ được xóa và tạo lại.
+    """
+
+    async def _step(conn: AsyncConnection) -> None:
+        index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+        valid = await conn.scalar(
+            text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": index_name},
+        )
+        if valid is True:
+            return
+        if valid is False:
+            await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+        await conn.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)))
+        logger.info(f"🗄️  Đã tạo index {index_name}")
+
+    return _step
+
+
+# Biểu thức tsvector của một note, dùng chung cho trigger và backfill
+_SEARCH_DOCUMENT_SQL = (
+    "setweight(to_tsvector('{cfg}', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('{cfg}', coalesce({row}content, '')), 'B')"
+)
+_BACKFILL_BATCH_SIZE = 1000
+
+
+def _search_dictionary() -> str:
+    return "simple" if settings.search_language == "simple" else f"{settings.search_language}_stem"
+
+
+async def _configure_search(conn: AsyncConnection) -> None:
+    """Tạo cấu hình text search riêng: từ có dấu đi qua unaccent trước khi stem/chuẩn hóa"""
+    exists = await conn.scalar(
+        text("SELECT 1 FROM pg_ts_config WHERE cfgname = :name"), {"name": SEARCH_TEXT_CONFIG}
+    )
+    if not exists:
+        await conn.execute(text(f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_TEXT_CONFIG} (COPY = simple)"))
+    dictionary = _search_dictionary()
+    await conn.execute(
+        text(
+            f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_TEXT_CONFIG} "
+            f"ALTER MAPPING FOR asciiword, asciihword, hword_asciipart WITH {dictionary}"
+        )
+    )
+    await conn.execute(
+        text(
+            f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_TEXT_CONFIG} "
+            f"ALTER MAPPING FOR word, hword, hword_part WITH unaccent, {dictionary}"
+        )
+    )
+
+
+async def _backfill_search_document(conn: AsyncConnection) -> None:
+    """Điền search_document cho các note cũ theo lô nhỏ, mỗi lô một transaction (không khóa cả bảng)"""
+    expression = _SEARCH_DOCUMENT_SQL.format(cfg=SEARCH_TEXT_CONFIG, row="")
+    total = 0
+    while True:
+        result = await conn.execute(
+            text(
+                f"UPDATE notes SET search_document = {expression} WHERE id IN ("
+                "SELECT id FROM notes WHERE search_document IS NULL LIMIT :batch FOR UPDATE SKIP LOCKED)"
+            ),
+            {"batch": _BACKFILL_BATCH_SIZE},
+        )
+        total += result.rowcount
+        if result.rowcount < _BACKFILL_BATCH_SIZE:
+            break
+    if total:
+        logger.info(f"🗄️  Đã dựng search_document cho {total} ghi chú")
+
+
+async def _drop_legacy_search_vector(conn: AsyncConnection) -> None:
+    """Bỏ cột generated search_vector cũ (cố định 'english'); chỉ chờ khóa tối đa 5 giây"""
+    await conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_notes_search"))
+    await conn.execute(text("SET lock_timeout = '5s'"))
+    try:
+        await conn.execute(text("ALTER TABLE notes DROP COLUMN IF EXISTS search_vector"))
+    except DBAPIError as exc:
+        logger.warning(f"⚠️  Chưa bỏ được cột notes.search_vector, sẽ thử lại lần khởi động sau: {exc}")
+    finally:
+        await conn.execute(text("RESET lock_timeout"))
+
+
+MIGRATIONS: List[MigrationStep] = [
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS reminder_claimed_until TIMESTAMP WITH TIME ZONE",
+    ensure_index("notes", "ix_notes_user_active"),
+    ensure_index("notes", "ix_notes_user_folder_active"),
+    ensure_index("notes", "ix_notes_user_trash"),
+    ensure_index("notes", "ix_notes_trash_expiry"),
+    ensure_index("notes", "ix_notes_reminder_due"),
+    ensure_index("notes", "ix_notes_folder_id"),
+    # Full-text search đa ngôn ngữ: cột tsvector thường + trigger thay cho cột generated cố định 'english'
+    _configure_search,
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_document tsvector",
+    (
+        "CREATE OR REPLACE FUNCTION notes_search_document_update() RETURNS trigger AS $$ "
+        "BEGIN NEW.search_document := "
+        + _SEARCH_DOCUMENT_SQL.format(cfg=SEARCH_TEXT_CONFIG, row="NEW.")
+        + "; RETURN NEW; END $$ LANGUAGE plpgsql"
+    ),
+    "DROP TRIGGER IF EXISTS notes_search_document_trg ON notes",
+    (
+        "CREATE TRIGGER notes_search_document_trg BEFORE INSERT OR UPDATE OF title, content ON notes "
+        "FOR EACH ROW EXECUTE FUNCTION notes_search_document_update()"
+    ),
+    _backfill_search_document,
+    ensure_index("notes", "ix_notes_search_document"),
+    _drop_legacy_search_vector,
+    ensure_index("notes", "ix_notes_user_title_trgm"),
+    ensure_index("notes", "ix_notes_user_title_prefix"),
+    # Thay bởi ix_notes_user_title_trgm (trigram trên tiêu đề của mọi user)
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_notes_title_trgm",
+    ensure_index("note_shares", "ix_note_shares_recipient_status"),
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS image_variants JSONB",
+]
+
+
+async def create_extensions(engine: AsyncEngine) -> None:
+    """Cài các extension trong EXTENSIONS (chạy trước create_all)"""
+    async with engine.begin() as conn:
+        for name in EXTENSIONS:
+            await conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {name}"))
+
+
+async def run_migrations(engine: AsyncEngine) -> None:
+    """Chạy các bước trong MIGRATIONS ở chế độ autocommit (cần cho CREATE INDEX CONCURRENTLY)"""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+        try:
+            for step in MIGRATIONS:
+                if isinstance(step, str):
+                    await conn.execute(text(step))
+                else:
+                    await step(conn)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+    logger.info(f"🗄️  Đã đồng bộ schema ({len(MIGRATIONS)} bước)")
@@ -1,12 +1,15 @@
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Index, String, Text, UniqueConstraint, Computed
-from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
 
+# Cấu hình full-text search (simple/english + unaccent), được tạo trong migrations
+SEARCH_TEXT_CONFIG = "smartnotes"
+
 
 class User(Base):
     __tablename__ = "users"
@@ -45,7 +48,47 @@ class NoteTag(Base):
 class Note(Base):
     __tablename__ = "notes"
     __table_args__ = (
-        Index("ix_notes_search", "search_vector", postgresql_using="gin"),
+        Index("ix_notes_search_document", "search_document", postgresql_using="gin"),
+        # search/suggest: trigram trên tiêu đề của từng user cho ILIKE '%q%' và so khớp gần đúng
+        # (pg_trgm + btree_gin để user_id nằm trong cùng index GIN, không lọc user sau khi đã khớp mọi tiêu đề)
+        Index(
+            "ix_notes_user_title_trgm",
+            "user_id",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # search/suggest với 1-2 ký tự (chưa đủ một trigram): tra khoảng prefix của lower(title)
+        Index(
+            "ix_notes_user_title_prefix",
+            "user_id",
+            text("lower(title) text_pattern_ops"),
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # list_notes / search_notes: ghi chú chưa xóa của user, sắp xếp theo (is_pinned, updated_at, id)
+        Index(
+            "ix_notes_user_active",
+            "user_id", "is_pinned", "updated_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_notes_user_folder_active",
+            "user_id", "folder_id", "is_pinned", "updated_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # list_trash
+        Index("ix_notes_user_trash", "user_id", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        # purge_worker: ghi chú hết hạn trong thùng rác của mọi user
+        Index("ix_notes_trash_expiry", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        # reminder_worker: nhắc nhở chưa gửi
+        Index(
+            "ix_notes_reminder_due",
+            "reminder_at",
+            postgresql_where=text("reminder_at IS NOT NULL AND NOT reminder_sent AND deleted_at IS NULL"),
+        ),
+        # xóa folder (ON DELETE SET NULL / cascade) cần tìm note theo folder_id
+        Index("ix_notes_folder_id", "folder_id"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
@@ -60,13 +103,14 @@ class Note(Base):
     is_public: Mapped[bool] = mapped_column(Boolean, default=False)
     reminder_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     reminder_sent: Mapped[bool] = mapped_column(Boolean, default=False)
+    reminder_claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     color: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     image_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    # URL các bản thu nhỏ {"thumb": ..., "medium": ...} khi ảnh được upload qua /notes/upload
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
     deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
-    search_vector: Mapped[str] = mapped_column(
-        TSVECTOR,
-        Computed("to_tsvector('english', coalesce(title,'') || ' ' || coalesce(content,''))", persisted=True),
-    )
+    # Cập nhật bởi trigger notes_search_document_trg (tiêu đề trọng số A, nội dung trọng số B)
+    search_vector: Mapped[Optional[str]] = mapped_column("search_document", TSVECTOR, nullable=True, deferred=True)
 
     owner: Mapped[User] = relationship(back_populates="notes")
     folder: Mapped[Optional[Folder]] = relationship(back_populates="notes")
@@ -103,7 +147,11 @@ class ShareLink(Base):
 
 class NoteShare(Base):
     __tablename__ = "note_shares"
-    __table_args__ = (UniqueConstraint("note_id", "shared_with_user_id", name="uq_note_share"),)
+    __table_args__ = (
+        UniqueConstraint("note_id", "shared_with_user_id", name="uq_note_share"),
+        # visible_notes_subquery: note_id của các share đã chấp nhận cho một user (index-only scan)
+        Index("ix_note_shares_recipient_status", "shared_with_user_id", "status", "note_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     note_id: Mapped[int] = mapped_column(ForeignKey("notes.id", ondelete="CASCADE"), index=True)
@@ -116,3 +164,40 @@ class NoteShare(Base):
     note: Mapped[Note] = relationship()
     shared_by: Mapped[User] = relationship(foreign_keys=[shared_by_user_id])
     shared_with: Mapped[User] = relationship(foreign_keys=[shared_with_user_id])
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_pending", "next_attempt_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    to_email: Mapped[str] = mapped_column(String(255))
+    subject: Mapped[str] = mapped_column(String(500))
+    html_content: Mapped[str] = mapped_column(Text)
+    text_content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending | sent | dead
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class Upload(Base):
+    """Ảnh client upload thẳng lên storage qua URL ký sẵn (presigned), API chỉ ghi nhận metadata"""
+
+    __tablename__ = "uploads"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    filename: Mapped[str] = mapped_column(String(255), unique=True)
+    content_type: Mapped[str] = mapped_column(String(100))
+    max_bytes: Mapped[int] = mapped_column(Integer)
+    size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending | completed
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
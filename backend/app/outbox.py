@@ -0,0 +1,205 @@
+"""
+Hàng đợi email bền vững (outbox): request chỉ INSERT, dispatcher nền gửi song song và retry
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import func, select, update
+
+from .models import EmailOutbox
+from .core.email import deliver_email
+from .core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Email đã claim sẽ được claim lại nếu dispatcher chết giữa chừng quá thời gian này
+_CLAIM_LEASE = timedelta(minutes=5)
+# Cửa sổ tính tốc độ gửi (giây)
+_RATE_WINDOW = 60.0
+
+_wakeup = asyncio.Event()
+_sent_times: deque = deque()
+_stats = {"depth": 0, "sent_total": 0, "failed_total": 0, "dead_total": 0}
+
+
+async def enqueue_email(
+    session: AsyncSession,
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None,
+) -> EmailOutbox:
+    """Thêm email vào outbox trong transaction hiện tại (caller tự commit, rồi gọi notify_outbox)"""
+    item = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        html_content=html_content,
+        text_content=text_content,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    session.add(item)
+    return item
+
+
+def notify_outbox() -> None:
+    """Đánh thức dispatcher ngay thay vì chờ hết chu kỳ poll"""
+    _wakeup.set()
+
+
+def outbox_metrics() -> dict:
+    now = time.monotonic()
+    while _sent_times and _sent_times[0] < now - _RATE_WINDOW:
+        _sent_times.popleft()
+    return {**_stats, "send_rate_per_second": round(len(_sent_times) / _RATE_WINDOW, 3)}
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.email_outbox_backoff_seconds * (2 ** (attempts - 1)))
+
+
+async def _claim_batch(session_factory: async_sessionmaker[AsyncSession], batch_size: int) -> list:
+    """Claim một lô email đến hạn bằng cách đẩy next_attempt_at ra sau một lease"""
+    now = datetime.now(timezone.utc)
+    async with session_factory() as session:
+        due_ids = (
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due_ids))
+            .values(next_attempt_at=now + _CLAIM_LEASE)
+            .returning(
+                EmailOutbox.id,
+                EmailOutbox.to_email,
+                EmailOutbox.subject,
+                EmailOutbox.html_content,
+                EmailOutbox.text_content,
+                EmailOutbox.attempts,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        await session.commit()
+    return rows
+
+
+async def dispatch_outbox_batch(
+    session_factory: async_sessionmaker[AsyncSession],
+    batch_size: int,
+    concurrency: int,
+) -> int:
+    """
+    Gửi một lô email trong outbox với tối đa `concurrency` email song song
+
+    Returns:
+        Số email đã claim trong lô
+    """
+    rows = await _claim_batch(session_factory, batch_size)
+    if not rows:
+        return 0
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _send(row):
+        async with slots:
+            try:
+                await deliver_email(row.to_email, row.subject, row.html_content, row.text_content)
+                return row, None
+            except Exception as e:
+                return row, e
+
+    results = await asyncio.gather(*[_send(row) for row in rows])
+
+    now = datetime.now(timezone.utc)
+    sent_ids = [row.id for row, error in results if error is None]
+    async with session_factory() as session:
+        if sent_ids:
+            await session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(sent_ids))
+                .values(status="sent", sent_at=now, attempts=EmailOutbox.attempts + 1, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        for row, error in results:
+            if error is None:
+                continue
+            attempts = row.attempts + 1
+            dead = attempts >= settings.email_outbox_max_attempts
+            await session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == row.id)
+                .values(
+                    status="dead" if dead else "pending",
+                    attempts=attempts,
+                    next_attempt_at=now + _backoff(attempts),
+                    last_error=str(error)[:1000],
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if dead:
+                _stats["dead_total"] += 1
+                logger.error(f"☠️ Email #{row.id} đến {row.to_email} bị bỏ sau {attempts} lần thử: {error}")
+            else:
+                logger.warning(f"⚠️ Email #{row.id} đến {row.to_email} lỗi lần {attempts}, sẽ thử lại: {error}")
+        await session.commit()
+
+    _stats["sent_total"] += len(sent_ids)
+    _stats["failed_total"] += len(rows) - len(sent_ids)
+    now_mono = time.monotonic()
+    _sent_times.extend([now_mono] * len(sent_ids))
+    return len(rows)
+
+
+async def _refresh_depth(session_factory: async_sessionmaker[AsyncSession]) -> None:
+    async with session_factory() as session:
+        result = await session.execute(
+            select(func.count()).select_from(EmailOutbox).where(EmailOutbox.status == "pending")
+        )
+        _stats["depth"] = result.scalar_one()
+
+
+async def outbox_dispatcher(session_factory: async_sessionmaker[AsyncSession]):
+    """
+    Background worker gửi email trong outbox
+
+    Gửi liên tục khi còn việc, khi hết thì chờ notify_outbox() hoặc tối đa EMAIL_OUTBOX_POLL_SECONDS giây
+    """
+    logger.info(
+        f"📮 Outbox dispatcher đã khởi động (song song {settings.email_outbox_concurrency}, "
+        f"lô {settings.email_outbox_batch_size})"
+    )
+
+    while True:
+        try:
+            _wakeup.clear()
+            claimed = await dispatch_outbox_batch(
+                session_factory,
+                batch_size=settings.email_outbox_batch_size,
+                concurrency=settings.email_outbox_concurrency,
+            )
+            await _refresh_depth(session_factory)
+            if claimed >= settings.email_outbox_batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.email_outbox_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        except asyncio.CancelledError:
+            logger.info("🛑 Outbox dispatcher đã dừng")
+            break
+        except Exception as e:
+            logger.error(f"❌ Lỗi trong outbox dispatcher: {str(e)}", exc_info=True)
+            await asyncio.sleep(settings.email_outbox_poll_seconds)
@@ -0,0 +1,84 @@
+"""
+Background task dọn thùng rác: xóa hẳn các ghi chú đã nằm trong thùng rác quá hạn
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, delete
+
+from .models import Note
+from .core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _purge_batch_statement(threshold: datetime, batch_size: int):
+    """DELETE một lô ghi chú nằm trong thùng rác từ trước threshold, cũ nhất trước (theo thứ tự ix_notes_trash_expiry)"""
+    expired_ids = (
+        select(Note.id)
+        .where(Note.deleted_at.is_not(None), Note.deleted_at < threshold)
+        .order_by(Note.deleted_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(Note).where(Note.id.in_(expired_ids)).execution_options(synchronize_session=False)
+
+
+async def purge_expired_notes(
+    session_factory: async_sessionmaker[AsyncSession],
+    retention_days: int,
+    batch_size: int,
+) -> int:
+    """
+    Xóa các ghi chú có deleted_at cũ hơn retention_days theo từng lô batch_size dòng
+
+    Mỗi lô là một transaction riêng và khóa dòng bằng FOR UPDATE SKIP LOCKED,
+    nên nhiều instance chạy cùng lúc sẽ không chờ nhau hay xóa trùng.
+
+    Returns:
+        Tổng số ghi chú đã xóa
+    """
+    threshold = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    total = 0
+
+    while True:
+        async with session_factory() as session:
+            result = await session.execute(_purge_batch_statement(threshold, batch_size))
+            await session.commit()
+
+        deleted = result.rowcount or 0
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+async def purge_worker(session_factory: async_sessionmaker[AsyncSession]):
+    """
+    Background worker dọn thùng rác định kỳ
+
+    Chạy mỗi TRASH_PURGE_INTERVAL_SECONDS giây
+    """
+    interval = settings.trash_purge_interval_seconds
+    logger.info(f"🧹 Purge worker đã khởi động (mỗi {interval} giây, lô {settings.trash_purge_batch_size} dòng)")
+
+    while True:
+        try:
+            purged = await purge_expired_notes(
+                session_factory,
+                retention_days=settings.trash_retention_days,
+                batch_size=settings.trash_purge_batch_size,
+            )
+            if purged:
+                logger.info(f"🧹 Đã xóa hẳn {purged} ghi chú trong thùng rác quá {settings.trash_retention_days} ngày")
+            else:
+                logger.debug("🧹 Không có ghi chú nào cần dọn")
+
+            await asyncio.sleep(interval)
+
+        except asyncio.CancelledError:
+            logger.info("🛑 Purge worker đã dừng")
+            break
+        except Exception as e:
+            logger.error(f"❌ Lỗi trong purge worker: {str(e)}", exc_info=True)
+            await asyncio.sleep(interval)
@@ -0,0 +1,86 @@
+"""
+Các câu query dùng chung: phạm vi ghi chú user được xem và danh sách ghi chú dạng rút gọn (summary)
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Note, NoteShare, NoteTag, Tag
+
+# Độ dài tối đa của đoạn trích (dòng đầu tiên) trong chế độ summary
+NOTE_EXCERPT_LENGTH = 160
+
+# Thứ tự danh sách ghi chú, khớp với index ix_notes_user_active / ix_notes_user_folder_active
+NOTE_LIST_ORDER = (Note.is_pinned.desc(), Note.updated_at.desc(), Note.id.desc())
+
+
+def visible_notes_subquery(
+    user_id: int,
+    columns: Sequence,
+    *criteria,
+    order_by: Sequence = (),
+    limit: Optional[int] = None,
+    include_shared: bool = True,
+):
+    """
+    Ghi chú user được xem (của user + được chia sẻ đã chấp nhận, chưa xóa) dưới dạng subquery
+
+    Hai nhánh UNION ALL thay cho OR ... IN (subquery): nhánh ghi chú của user đọc theo thứ tự trên index
+    (user_id, ...) và dừng ở LIMIT, nhánh chia sẻ đi qua ix_note_shares_recipient_status rồi join theo khóa chính.
+    Mỗi nhánh đã ORDER BY/LIMIT riêng, câu query ngoài phải sắp xếp và LIMIT lại trên kết quả hợp.
+    """
+    branches = [select(*columns).where(Note.user_id == user_id)]
+    if include_shared:
+        branches.append(
+            select(*columns)
+            .join(NoteShare, NoteShare.note_id == Note.id)
+            .where(
+                NoteShare.shared_with_user_id == user_id,
+                NoteShare.status == "accepted",
+                Note.user_id != user_id,
+            )
+        )
+    branches = [
+        branch.where(Note.deleted_at.is_(None), *criteria).order_by(*order_by).limit(limit) for branch in branches
+    ]
+    query = branches[0] if len(branches) == 1 else union_all(*branches)
+    return query.subquery("visible_notes")
+
+
+def note_summary_columns():
+    """Chỉ các cột cần cho card ghi chú, excerpt được cắt sẵn ở phía database"""
+    return (
+        Note.id,
+        Note.user_id,
+        Note.title,
+        func.split_part(func.left(Note.content, NOTE_EXCERPT_LENGTH), "\n", 1).label("excerpt"),
+        Note.is_markdown,
+        Note.folder_id,
+        Note.color,
+        Note.image_url,
+        Note.image_variants,
+        Note.is_pinned,
+        Note.is_public,
+        Note.reminder_at,
+        Note.created_at,
+        Note.updated_at,
+        Note.deleted_at,
+    )
+
+
+async def build_note_summaries(session: AsyncSession, rows: Sequence) -> List[dict]:
+    """Gắn tags cho các dòng summary bằng đúng một query, không dựng ORM entity"""
+    note_ids = [row.id for row in rows]
+    tags_by_note: Dict[int, List[dict]] = defaultdict(list)
+    if note_ids:
+        tag_rows = await session.execute(
+            select(NoteTag.note_id, Tag.id, Tag.name, Tag.created_at)
+            .join(Tag, Tag.id == NoteTag.tag_id)
+            .where(NoteTag.note_id.in_(note_ids))
+        )
+        for note_id, tag_id, name, created_at in tag_rows:
+            tags_by_note[note_id].append({"id": tag_id, "name": name, "created_at": created_at})
+
+    return [{**row._mapping, "tags": tags_by_note[row.id]} for row in rows]
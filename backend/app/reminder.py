@@ -2,9 +2,11 @@
 Background task để kiểm tra và gửi email nhắc nhở cho ghi chú
 """
 import asyncio
-from datetime import datetime, timezone
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, and_, or_, func
 
 from .models import Note, User
 from .core.email import send_reminder_email
@@ -13,88 +15,278 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Email chỉ hiển thị 200 ký tự đầu của nội dung (thêm 1 ký tự để biết có cần "...")
+_REMINDER_CONTENT_CHARS = 201
+
+ReminderSender = Callable[..., Awaitable[bool]]
+
+
+def _as_utc(note_id: int, reminder_time: datetime) -> datetime:
+    """Đảm bảo reminder_at có timezone UTC"""
+    if reminder_time.tzinfo is None:
+        # Nếu không có timezone, giả sử là UTC
+        logger.warning(f"⚠️ Note ID {note_id} có reminder_at không có timezone, đã convert sang UTC")
+        return reminder_time.replace(tzinfo=timezone.utc)
+    if reminder_time.tzinfo != timezone.utc:
+        return reminder_time.astimezone(timezone.utc)
+    return reminder_time
+
+
+async def _send_batch(rows, concurrency: int, send: ReminderSender) -> List[int]:
+    """Gửi một lô nhắc nhở với tối đa `concurrency` email song song, trả về id các note đã gửi"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _send_one(row) -> bool:
+        async with slots:
+            try:
+                return await send(
+                    email=row.email,
+                    username=row.username,
+                    note_title=row.title,
+                    note_content=row.content,
+                    reminder_time=_as_utc(row.id, row.reminder_at),
+                )
+            except Exception as e:
+                logger.error(f"❌ Lỗi khi gửi email nhắc nhở cho note ID {row.id}: {str(e)}", exc_info=True)
+                return False
+
+    results = await asyncio.gather(*[_send_one(row) for row in rows])
+    for row, success in zip(rows, results):
+        if not success:
+            logger.warning(f"⚠️ Không thể gửi email nhắc nhở cho note ID {row.id} - Kiểm tra cấu hình SMTP")
+    return [row.id for row, success in zip(rows, results) if success]
+
+
+def _claim_statement(now: datetime, batch_size: int, claim_until: datetime):
+    """UPDATE ... RETURNING claim tối đa `batch_size` nhắc nhở đến hạn lúc `now` (index ix_notes_reminder_due)"""
+    due_ids = (
+        select(Note.id)
+        .where(
+            and_(
+                Note.reminder_at.is_not(None),
+                Note.reminder_at <= now,
+                Note.reminder_sent == False,
+                Note.deleted_at.is_(None),
+                or_(Note.reminder_claimed_until.is_(None), Note.reminder_claimed_until < now),
+            )
+        )
+        .order_by(Note.reminder_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    # UPDATE trên bảng (Core) để RETURNING được cả cột của users qua UPDATE ... FROM
+    return (
+        update(Note.__table__)
+        .where(Note.id.in_(due_ids), User.id == Note.user_id)
+        .values(reminder_claimed_until=claim_until)
+        .returning(
+            Note.id,
+            Note.title,
+            func.left(Note.content, _REMINDER_CONTENT_CHARS).label("content"),
+            Note.reminder_at,
+            User.email,
+            User.username,
+        )
+    )
+
+
+async def _claim_due_reminders(
+    session_factory: async_sessionmaker[AsyncSession],
+    batch_size: int,
+    claim_until: datetime,
+):
+    """
+    Claim tối đa `batch_size` nhắc nhở đến hạn bằng lease reminder_claimed_until
+
+    FOR UPDATE SKIP LOCKED giúp nhiều worker (nhiều process/instance) chia nhau các dòng
+    mà không gửi trùng; claim của worker bị chết sẽ hết hạn và được worker khác nhận lại.
+    """
+    async with session_factory() as session:
+        result = await session.execute(_claim_statement(datetime.now(timezone.utc), batch_size, claim_until))
+        rows = result.all()
+        await session.commit()
+    return rows
+
+
+async def dispatch_due_reminders(
+    session_factory: async_sessionmaker[AsyncSession],
+    batch_size: int,
+    concurrency: int,
+    send: ReminderSender = send_reminder_email,
+) -> int:
+    """
+    Gửi tất cả nhắc nhở đã đến hạn theo từng lô `batch_size` note đã claim
+
+    Mỗi lô được gửi song song rồi đánh dấu reminder_sent bằng một câu UPDATE duy nhất.
+    Note gửi lỗi giữ nguyên claim nên sẽ được thử lại khi lease hết hạn.
+
+    Returns:
+        Số email nhắc nhở đã gửi thành công
+    """
+    total_sent = 0
+
+    while True:
+        claim_until = datetime.now(timezone.utc) + timedelta(seconds=settings.reminder_lease_seconds)
+        rows = await _claim_due_reminders(session_factory, batch_size, claim_until)
+        if not rows:
+            break
+
+        sent_ids = await _send_batch(rows, concurrency, send)
+        if sent_ids:
+            async with session_factory() as session:
+                # Chỉ đánh dấu các note vẫn còn giữ đúng claim này (user có thể đã đổi reminder_at)
+                await session.execute(
+                    update(Note)
+                    .where(Note.id.in_(sent_ids), Note.reminder_claimed_until == claim_until)
+                    .values(reminder_sent=True, reminder_claimed_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+        total_sent += len(sent_ids)
+        logger.info(f"📧 Đã gửi {len(sent_ids)}/{len(rows)} email nhắc nhở trong lô")
+
+        if len(rows) < batch_size:
+            break
+
+    return total_sent
+
+
+class ReminderScheduler:
+    """
+    Lịch nhắc nhở trong process: min-heap (reminder_at, note_id) của các nhắc nhở sắp tới
+
+    Chỉ giữ các nhắc nhở trong cửa sổ REMINDER_WINDOW_SECONDS; phần xa hơn được nạp ở lần reconcile sau.
+    Hủy/đổi lịch dùng xóa lười: entry cũ trong heap bị bỏ qua khi không khớp `_due_at`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._heap: List[Tuple[datetime, int]] = []
+        self._due_at: Dict[int, datetime] = {}
+        self._changed = asyncio.Event()
+
+    def horizon(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=settings.reminder_window_seconds)
+
+    def schedule(self, note_id: int, when: Optional[datetime]) -> None:
+        """Đặt (hoặc hủy nếu when=None) lịch nhắc cho một note, gọi sau khi commit"""
+        if not self.enabled:
+            return
+        if when is None:
+            self.cancel(note_id)
+            return
+        when = _as_utc(note_id, when)
+        if when > self.horizon():
+            self._due_at.pop(note_id, None)
+            return
+        self._due_at[note_id] = when
+        heapq.heappush(self._heap, (when, note_id))
+        self._changed.set()
+
+    def cancel(self, note_id: int) -> None:
+        self._due_at.pop(note_id, None)
+
+    def load(self, entries) -> None:
+        """Thay toàn bộ lịch bằng danh sách (note_id, reminder_at) đọc từ database"""
+        self._due_at = {note_id: _as_utc(note_id, when) for note_id, when in entries}
+        self._heap = [(when, note_id) for note_id, when in self._due_at.items()]
+        heapq.heapify(self._heap)
+        self._changed.set()
+
+    def next_due(self) -> Optional[datetime]:
+        while self._heap:
+            when, note_id = self._heap[0]
+            if self._due_at.get(note_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        due = []
+        while (when := self.next_due()) is not None and when <= now:
+            _, note_id = heapq.heappop(self._heap)
+            self._due_at.pop(note_id, None)
+            due.append(note_id)
+        return due
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    async def wait(self, max_seconds: float) -> None:
+        """Ngủ tới nhắc nhở gần nhất, tối đa max_seconds, hoặc tới khi lịch thay đổi"""
+        self._changed.clear()
+        timeout = max_seconds
+        next_due = self.next_due()
+        if next_due is not None:
+            timeout = min(timeout, max(0.0, (next_due - datetime.now(timezone.utc)).total_seconds()))
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+async def _load_upcoming(session_factory: async_sessionmaker[AsyncSession], scheduler: ReminderScheduler) -> None:
+    """Nạp lại các nhắc nhở chưa gửi trong cửa sổ sắp tới vào scheduler"""
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Note.id, Note.reminder_at)
+            .where(
+                and_(
+                    Note.reminder_at.is_not(None),
+                    Note.reminder_at <= scheduler.horizon(),
+                    Note.reminder_sent == False,
+                    Note.deleted_at.is_(None),
+                )
+            )
+            .order_by(Note.reminder_at)
+            .limit(settings.reminder_window_max_items)
+        )
+        scheduler.load(result.all())
+
 
 async def reminder_worker(session_factory: async_sessionmaker[AsyncSession]):
     """
-    Background worker kiểm tra và gửi email nhắc nhở định kỳ
-    
-    Chạy mỗi 60 giây để kiểm tra các ghi chú có reminder_at đã đến thời gian
+    Background worker gửi email nhắc nhở đúng thời điểm
+
+    Ngủ tới reminder_at gần nhất trong reminder_scheduler (create/update note cập nhật lịch ngay),
+    và cứ REMINDER_RECONCILE_SECONDS giây lại quét database một lần để không bỏ sót.
     """
     logger.info("🚀 Reminder worker đã khởi động")
     logger.info(f"📧 SMTP Host: {settings.smtp_host}")
     logger.info(f"📧 SMTP User: {settings.smtp_user}")
-    logger.info(f"⏰ Kiểm tra reminder mỗi 60 giây")
-    
+    logger.info(f"⏰ Reconcile reminder mỗi {settings.reminder_reconcile_seconds} giây")
+
+    scheduler = reminder_scheduler
+    scheduler.enabled = True
+    next_reconcile = 0.0
+
     while True:
         try:
-            await asyncio.sleep(60)  # Kiểm tra mỗi 60 giây
-            
-            async with session_factory() as session:
-                # Tìm các ghi chú có reminder_at đã đến và chưa gửi email
-                now = datetime.now(timezone.utc)
-                
-                # Tìm các note có reminder_at <= now và reminder_sent = False
-                # Đảm bảo reminder_at có timezone và convert sang UTC nếu cần
-                result = await session.execute(
-                    select(Note, User)
-                    .join(User, Note.user_id == User.id)
-                    .where(
-                        and_(
-                            Note.reminder_at.is_not(None),
-                            Note.reminder_at <= now,
-                            Note.reminder_sent == False,
-                            Note.deleted_at.is_(None)
-                        )
-                    )
+            loop_time = asyncio.get_running_loop().time()
+            reconcile = loop_time >= next_reconcile
+            if reconcile or scheduler.pop_due(datetime.now(timezone.utc)):
+                sent = await dispatch_due_reminders(
+                    session_factory,
+                    batch_size=settings.reminder_batch_size,
+                    concurrency=settings.reminder_concurrency,
                 )
-                
-                notes_to_remind = result.all()
-                
-                if notes_to_remind:
-                    logger.info(f"📧 Tìm thấy {len(notes_to_remind)} ghi chú cần nhắc nhở")
-                    for note, user in notes_to_remind:
-                        logger.info(f"  - Note ID {note.id}: '{note.title[:30]}...' → {user.email} (reminder_at: {note.reminder_at})")
-                
-                for note, user in notes_to_remind:
-                    try:
-                        # Đảm bảo reminder_at có timezone UTC
-                        reminder_time = note.reminder_at
-                        if reminder_time.tzinfo is None:
-                            # Nếu không có timezone, giả sử là UTC
-                            reminder_time = reminder_time.replace(tzinfo=timezone.utc)
-                            logger.warning(f"⚠️ Note ID {note.id} có reminder_at không có timezone, đã convert sang UTC")
-                        elif reminder_time.tzinfo != timezone.utc:
-                            # Convert sang UTC
-                            reminder_time = reminder_time.astimezone(timezone.utc)
-                            logger.info(f"🔄 Note ID {note.id} đã convert reminder_at sang UTC: {reminder_time}")
-                        
-                        # Gửi email nhắc nhở
-                        logger.info(f"📤 Đang gửi email nhắc nhở cho note ID {note.id} đến {user.email}...")
-                        success = await send_reminder_email(
-                            email=user.email,
-                            username=user.username,
-                            note_title=note.title,
-                            note_content=note.content,
-                            reminder_time=reminder_time
-                        )
-                        
-                        if success:
-                            # Đánh dấu đã gửi email
-                            note.reminder_sent = True
-                            await session.commit()
-                            logger.info(f"✅ Đã gửi email nhắc nhở cho note ID {note.id} đến {user.email}")
-                        else:
-                            logger.warning(f"⚠️ Không thể gửi email nhắc nhở cho note ID {note.id} - Kiểm tra cấu hình SMTP")
-                    
-                    except Exception as e:
-                        logger.error(f"❌ Lỗi khi gửi email nhắc nhở cho note ID {note.id}: {str(e)}", exc_info=True)
-                        # Tiếp tục với note tiếp theo, không dừng worker
-                        continue
-                
+                if sent:
+                    logger.info(f"✅ Đã gửi tổng cộng {sent} email nhắc nhở")
+            if reconcile:
+                await _load_upcoming(session_factory, scheduler)
+                next_reconcile = loop_time + settings.reminder_reconcile_seconds
+
+            await scheduler.wait(max(0.0, next_reconcile - asyncio.get_running_loop().time()))
+
         except asyncio.CancelledError:
+            scheduler.enabled = False
             logger.info("🛑 Reminder worker đã dừng")
             break
         except Exception as e:
             logger.error(f"❌ Lỗi trong reminder worker: {str(e)}", exc_info=True)
             # Tiếp tục chạy, không dừng worker
-            await asyncio.sleep(60)
+            next_reconcile = 0.0
+            await asyncio.sleep(settings.reminder_reconcile_seconds)
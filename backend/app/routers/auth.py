@@ -8,10 +8,11 @@ from sqlalchemy import select, or_
 from .. import schemas
 from ..core import security
 from ..core.config import settings
-from ..core.email import send_welcome_email
+from ..core.email import render_welcome_email, smtp_configured
 from ..database import get_session
-from ..deps import get_current_user
+from ..deps import get_current_user, invalidate_user
 from ..models import User
+from ..outbox import enqueue_email, notify_outbox
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -27,23 +28,24 @@ async def register(user_in: schemas.UserCreate, session: AsyncSession = Depends(
     if existing_username.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Username already taken")
 
+    try:
+        hashed_password = await security.get_password_hash_async(user_in.password)
+    except security.PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
     user = User(
         username=user_in.username,
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password)
+        hashed_password=hashed_password
     )
     session.add(user)
+    # Email chào mừng được đưa vào outbox trong cùng transaction, dispatcher nền sẽ gửi
+    if smtp_configured():
+        await enqueue_email(session, user.email, *render_welcome_email(user.email, user.username))
     await session.commit()
     await session.refresh(user)
-    
-    # Gửi email chào mừng (không block nếu lỗi)
-    try:
-        await send_welcome_email(user.email, user.username)
-    except Exception as e:
-        # Log lỗi nhưng không làm fail đăng ký
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Không thể gửi email chào mừng: {str(e)}")
+    invalidate_user(user.email)
+    notify_outbox()
     
     return user
 
@@ -59,14 +61,20 @@ async def login_for_access_token(
         )
     )
     user = result.scalar_one_or_none()
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    try:
+        password_ok = bool(user) and await security.verify_password_async(form_data.password, user.hashed_password)
+    except security.PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email/username or password",
         )
 
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    token = security.create_access_token(subject=user.email, expires_delta=access_token_expires)
+    token = security.create_access_token(
+        subject=user.email, expires_delta=access_token_expires, user_id=user.id
+    )
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+from uuid import uuid4
+
+import aiofiles
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas
+from ..core.config import settings
+from ..core.limits import upload_too_large_detail
+from ..core.storage import (
+    UPLOADS_DIR,
+    presign_s3_upload,
+    promote_s3_upload,
+    s3_object_url,
+    sign_local_upload,
+    verify_local_upload,
+)
+from ..database import AsyncSessionLocal, get_session
+from ..deps import get_current_user
+from ..images import IMAGE_TYPES, image_variant_urls
+from ..models import Note, Upload, User
+from ..share_cache import invalidate_public_note
+
+router = APIRouter(prefix="/files", tags=["files"])
+
+
+def _local_path(filename: str) -> str:
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return os.path.join(UPLOADS_DIR, filename)
+
+
+@router.post("/presign", response_model=schemas.UploadPresignOut, status_code=status.HTTP_201_CREATED)
+async def presign_upload(
+    body: schemas.UploadPresignRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Cấp URL để client upload ảnh thẳng lên storage (S3 presigned POST, hoặc PUT vào thư mục local khi dev)
+
+    Kích thước file bị giới hạn đúng bằng `size` khai báo; sau khi upload xong gọi POST /files/{id}/complete.
+    """
+    # Phần mở rộng lấy theo content type trong danh sách cố định, không theo tên file của client:
+    # file upload thẳng không qua Pillow, nên .html/.svg sẽ được /uploads phục vụ như trang web
+    ext = IMAGE_TYPES.get(body.content_type)
+    if ext is None:
+        raise HTTPException(status_code=400, detail="Chỉ cho phép tải lên ảnh JPEG, PNG, GIF hoặc WebP")
+    if body.size > settings.upload_max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=upload_too_large_detail())
+
+    filename = f"{uuid4().hex}{ext}"
+    expires_in = settings.upload_presign_expires_seconds
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+
+    upload = Upload(
+        user_id=current_user.id,
+        filename=filename,
+        content_type=body.content_type,
+        max_bytes=body.size,
+        status="pending",
+        expires_at=expires_at,
+    )
+    session.add(upload)
+    await session.flush()
+
+    if settings.s3_enabled:
+        try:
+            presigned = await asyncio.to_thread(presign_s3_upload, filename, body.content_type, body.size, expires_in)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc))
+        result = schemas.UploadPresignOut(
+            upload_id=upload.id,
+            method="POST",
+            url=presigned["url"],
+            fields=presigned["fields"],
+            expires_at=expires_at,
+        )
+    else:
+        expires = int(expires_at.timestamp())
+        query = urlencode(
+            {
+                "content_type": body.content_type,
+                "max_bytes": body.size,
+                "expires": expires,
+                "signature": sign_local_upload(filename, body.content_type, body.size, expires),
+            }
+        )
+        result = schemas.UploadPresignOut(
+            upload_id=upload.id,
+            method="PUT",
+            url=f"{request.url_for('receive_local_upload', filename=filename)}?{query}",
+            headers={"Content-Type": body.content_type},
+            expires_at=expires_at,
+        )
+
+    await session.commit()
+    return result
+
+
+@router.put("/local/{filename}", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_local_upload(
+    filename: str,
+    request: Request,
+    content_type: str = Query(...),
+    max_bytes: int = Query(...),
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """
+    Nhận file upload trực tiếp khi không dùng S3: xác thực bằng chữ ký trong URL, ghi stream ra đĩa
+
+    Mỗi URL chỉ ghi được một lần: file đã tồn tại hoặc upload không còn pending thì trả 409, vì file trong
+    /uploads được phục vụ với cache immutable và không được phép đổi nội dung.
+    """
+    if settings.s3_enabled:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not verify_local_upload(filename, content_type, max_bytes, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    if expires < time.time():
+        raise HTTPException(status_code=403, detail="Upload URL expired")
+    if request.headers.get("content-type") != content_type:
+        raise HTTPException(status_code=400, detail="Content-Type does not match")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+    path = _local_path(filename)
+    # Session ngắn, không giữ connection trong lúc nhận file
+    async with AsyncSessionLocal() as session:
+        upload_status = await session.scalar(select(Upload.status).where(Upload.filename == filename))
+    if upload_status is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload_status != "pending" or os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File already uploaded")
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    fd, partial_path = tempfile.mkstemp(dir=UPLOADS_DIR, prefix=f".{filename}.", suffix=".part")
+    os.close(fd)
+    written = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as f:
+            async for chunk in request.stream():
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+                await f.write(chunk)
+        if written == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+        # mkstemp tạo file 0600
+        os.chmod(partial_path, 0o644)
+        try:
+            # link thay cho replace: không ghi đè nếu một PUT khác với cùng URL đã xong trước
+            os.link(partial_path, path)
+        except FileExistsError:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File already uploaded")
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/{upload_id}/complete", response_model=schemas.UploadOut)
+async def complete_upload(
+    upload_id: int,
+    body: schemas.UploadCompleteRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Xác nhận ảnh đã nằm trên storage, ghi nhận kích thước/URL và (tùy chọn) gắn vào ghi chú
+
+    S3: ảnh được chép từ incoming/ sang uploads/ đúng một lần (khóa dòng upload), nên gửi lại form
+    presigned sau đó không đổi được ảnh đã gắn vào ghi chú.
+    """
+    upload = await session.get(Upload, upload_id, with_for_update=True)
+    if not upload or upload.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    note = None
+    if body.note_id is not None:
+        note = await session.get(Note, body.note_id)
+        if not note or note.user_id != current_user.id or note.deleted_at is not None:
+            raise HTTPException(status_code=404, detail="Note not found")
+
+    if upload.status != "completed":
+        if settings.s3_enabled:
+            try:
+                size = await promote_s3_upload(upload.filename, upload.content_type)
+            except RuntimeError as exc:
+                raise HTTPException(status_code=500, detail=str(exc))
+            url = s3_object_url(f"uploads/{upload.filename}")
+        else:
+            path = _local_path(upload.filename)
+            size = (await asyncio.to_thread(os.stat, path)).st_size if os.path.exists(path) else None
+            url = f"/uploads/{upload.filename}"
+        if size is None:
+            raise HTTPException(status_code=400, detail="File chưa được upload")
+
+        upload.size = size
+        upload.url = url
+        upload.status = "completed"
+        upload.completed_at = datetime.now(timezone.utc)
+
+    if note is not None:
+        note.image_url = upload.url
+        note.image_variants = image_variant_urls(upload.url)
+    await session.commit()
+    if note is not None:
+        invalidate_public_note(note.id)
+    return upload
@@ -6,14 +6,15 @@ from sqlalchemy import select, delete
 
 from .. import schemas
 from ..database import get_session
-from ..deps import get_current_user
-from ..models import Folder, User
+from ..deps import get_current_user, get_user_read_session
+from ..models import Folder, Note, User
+from ..share_cache import invalidate_public_notes
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
 
 @router.get("", response_model=List[schemas.FolderOut])
-async def list_folders(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def list_folders(session: AsyncSession = Depends(get_user_read_session), current_user: User = Depends(get_current_user)):
     result = await session.execute(select(Folder).where(Folder.user_id == current_user.id))
     return result.scalars().all()
 
@@ -46,7 +47,10 @@ async def delete_folder(
     if not folder or folder.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Folder not found")
 
+    # Ghi chú trong folder bị xóa theo cascade: gỡ trang chia sẻ công khai của chúng khỏi cache
+    note_ids = (await session.scalars(select(Note.id).where(Note.folder_id == folder.id))).all()
     await session.delete(folder)
     await session.commit()
+    invalidate_public_notes(note_ids)
     return None
 
@@ -1,20 +1,27 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, status
 from fastapi.responses import JSONResponse
-from sqlalchemy import select, delete
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from uuid import uuid4
-import os
+import zipfile
 
 from .. import schemas
 from ..database import get_session
-from ..deps import get_current_user
-from ..models import Folder, Note, Tag, User, NoteShare
+from ..deps import get_current_user, get_user_read_session
+from ..models import Folder, Note, NoteTag, Tag, User
 from ..core.config import settings
-from ..core.storage import upload_image_to_s3
+from ..core.limits import upload_too_large_detail
+from ..core.pagination import InvalidCursor, decode_cursor, encode_cursor
+from ..core.storage import upload_size
+from ..images import InvalidImage, image_variant_urls, store_image
+from ..importer import import_notes, iter_markdown_zip, iter_ndjson
+from ..queries import NOTE_LIST_ORDER, build_note_summaries, note_summary_columns, visible_notes_subquery
+from ..reminder import reminder_scheduler
+from ..share_cache import invalidate_public_note, invalidate_public_notes
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
@@ -38,82 +45,157 @@ async def _load_tags(session: AsyncSession, user_id: int, tag_ids: List[int]) ->
     return tags
 
 
-async def _purge_deleted(session: AsyncSession):
-    """Xóa hẳn các ghi chú đã trong thùng rác > 30 ngày"""
-    threshold = datetime.utcnow() - timedelta(days=30)
-    await session.execute(delete(Note).where(Note.deleted_at.is_not(None), Note.deleted_at < threshold))
-    await session.commit()
+async def _check_owned_notes(session: AsyncSession, user_id: int, note_ids: List[int]) -> List[int]:
+    """Kiểm tra quyền sở hữu nhiều ghi chú (chưa xóa) bằng một query"""
+    note_ids = list(set(note_ids))
+    result = await session.execute(
+        select(Note.id).where(Note.id.in_(note_ids), Note.user_id == user_id, Note.deleted_at.is_(None))
+    )
+    if len(result.all()) != len(note_ids):
+        raise HTTPException(status_code=404, detail="Some notes not found")
+    return note_ids
+
+
+async def _bulk_update_notes(session: AsyncSession, user_id: int, note_ids: List[int], values: dict, trashed: bool = False):
+    """
+    UPDATE nhiều ghi chú của user trong một câu lệnh, kiểm tra quyền sở hữu qua RETURNING
+
+    Nếu có id không thuộc user (hoặc sai trạng thái thùng rác) thì không ghi gì và trả 404.
+    """
+    note_ids = set(note_ids)
+    in_trash = Note.deleted_at.is_not(None) if trashed else Note.deleted_at.is_(None)
+    result = await session.execute(
+        update(Note)
+        .where(Note.id.in_(note_ids), Note.user_id == user_id, in_trash)
+        .values(**values)
+        .returning(Note.id, Note.reminder_at, Note.reminder_sent)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    if len(rows) != len(note_ids):
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Some notes not found")
+    return rows
+
+
+def _cursor_criterion(cursor: str):
+    """Điều kiện keyset (is_pinned, updated_at, id) < cursor"""
+    try:
+        is_pinned, updated_at, last_id = decode_cursor(cursor, 3)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(is_pinned, bool) or not isinstance(updated_at, datetime) or not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple_(Note.is_pinned, Note.updated_at, Note.id) < tuple_(is_pinned, updated_at, last_id)
+
+
+def _visible_notes_query(
+    query, user_id: int, folder_id: Optional[int], cursor: Optional[str] = None, limit: Optional[int] = None
+):
+    """
+    Ghi chú của user và ghi chú được chia sẻ (đã chấp nhận) trong một câu query, sắp xếp sẵn
+
+    Mỗi nhánh của UNION ALL chỉ lấy tối đa `limit` dòng sau cursor, nên trang đầu hay trang thứ
+    một trăm đều đọc cùng số dòng trên index, bất kể user có bao nhiêu ghi chú.
+    """
+    criteria = []
+    if folder_id is not None:
+        criteria.append(Note.folder_id == folder_id)
+    if cursor:
+        criteria.append(_cursor_criterion(cursor))
+    visible = visible_notes_subquery(
+        user_id, (Note.id, Note.is_pinned, Note.updated_at), *criteria, order_by=NOTE_LIST_ORDER, limit=limit
+    )
+    return (
+        query
+        .join(visible, visible.c.id == Note.id)
+        .order_by(visible.c.is_pinned.desc(), visible.c.updated_at.desc(), visible.c.id.desc())
+        .limit(limit)
+    )
+
+
+def _trash_query(query, user_id: int):
+    """Ghi chú trong thùng rác của user, mới xóa trước (index ix_notes_user_trash)"""
+    return query.where(Note.user_id == user_id, Note.deleted_at.is_not(None)).order_by(Note.deleted_at.desc())
+
+
+def _split_page(rows, limit: int):
+    """Cắt kết quả đã lấy dư 1 dòng thành (trang hiện tại, cursor trang sau)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([last.is_pinned, last.updated_at, last.id])
 
 
 @router.get("", response_model=List[schemas.NoteOut])
 async def list_notes(
     folder_id: Optional[int] = None,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_read_session),
     current_user: User = Depends(get_current_user),
 ):
-    await _purge_deleted(session)
-    
-    query = (
-        select(Note)
-        .where(Note.user_id == current_user.id)
-        .where(Note.deleted_at.is_(None))
-        .options(selectinload(Note.tags), selectinload(Note.folder))
-    )
-    
-    if folder_id is not None:
-        query = query.where(Note.folder_id == folder_id)
-    
+    query = _visible_notes_query(select(Note).options(selectinload(Note.tags)), current_user.id, folder_id)
     result = await session.execute(query)
-    user_notes = result.scalars().all()
-    
-    shared_query = (
-        select(Note)
-        .join(NoteShare, NoteShare.note_id == Note.id)
-        .where(
-            NoteShare.shared_with_user_id == current_user.id,
-            NoteShare.status == "accepted",
-            Note.deleted_at.is_(None)
-        )
-        .options(selectinload(Note.tags), selectinload(Note.folder))
+    return result.scalars().all()
+
+
+@router.get("/page", response_model=schemas.NotePage)
+async def list_notes_page(
+    folder_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Danh sách ghi chú phân trang theo keyset (is_pinned, updated_at, id)"""
+    query = _visible_notes_query(
+        select(Note).options(selectinload(Note.tags)), current_user.id, folder_id, cursor, limit + 1
     )
-    
-    if folder_id is not None:
-        shared_query = shared_query.where(Note.folder_id == folder_id)
-    
-    shared_result = await session.execute(shared_query)
-    shared_notes = shared_result.scalars().all()
-    
-    all_notes = list(user_notes)
-    note_ids = {note.id for note in user_notes}
-    for note in shared_notes:
-        if note.id not in note_ids:
-            all_notes.append(note)
-    
-    all_notes.sort(key=lambda n: (not n.is_pinned, n.updated_at), reverse=True)
-    
-    return all_notes
+    result = await session.execute(query)
+    notes, next_cursor = _split_page(result.scalars().all(), limit)
+    return schemas.NotePage(items=notes, next_cursor=next_cursor)
+
+
+@router.get("/summary", response_model=schemas.NoteSummaryPage)
+async def list_notes_summary(
+    folder_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Như /notes/page nhưng chỉ trả về các cột cần cho card và đoạn trích thay cho content"""
+    query = _visible_notes_query(select(*note_summary_columns()), current_user.id, folder_id, cursor, limit + 1)
+    result = await session.execute(query)
+    rows, next_cursor = _split_page(result.all(), limit)
+    items = await build_note_summaries(session, rows)
+    return schemas.NoteSummaryPage(items=items, next_cursor=next_cursor)
 
 
 @router.get("/trash", response_model=List[schemas.NoteOut])
 async def list_trash(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_read_session),
     current_user: User = Depends(get_current_user),
 ):
-    await _purge_deleted(session)
     result = await session.execute(
-        select(Note)
-        .where(Note.user_id == current_user.id)
-        .where(Note.deleted_at.is_not(None))
-        .options(selectinload(Note.tags), selectinload(Note.folder))
-        .order_by(Note.deleted_at.desc())
+        _trash_query(select(Note).options(selectinload(Note.tags), selectinload(Note.folder)), current_user.id)
     )
     return result.scalars().all()
 
 
+@router.get("/trash/summary", response_model=List[schemas.NoteSummaryOut])
+async def list_trash_summary(
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    result = await session.execute(_trash_query(select(*note_summary_columns()), current_user.id))
+    return await build_note_summaries(session, result.all())
+
+
 @router.get("/{note_id}", response_model=schemas.NoteOut)
 async def get_note(
     note_id: int,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_read_session),
     current_user: User = Depends(get_current_user),
 ):
     result = await session.execute(
@@ -127,6 +209,94 @@ async def get_note(
     return note
 
 
+@router.post("/bulk/move", response_model=schemas.NoteBulkResult)
+async def bulk_move_notes(
+    body: schemas.NoteBulkMove,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Chuyển nhiều ghi chú vào một folder (folder_id=null để bỏ khỏi folder)"""
+    await _ensure_folder(session, current_user.id, body.folder_id)
+    rows = await _bulk_update_notes(session, current_user.id, body.note_ids, {"folder_id": body.folder_id})
+    await session.commit()
+    return schemas.NoteBulkResult(updated=len(rows))
+
+
+@router.post("/bulk/tags/add", response_model=schemas.NoteBulkResult)
+async def bulk_add_tags(
+    body: schemas.NoteBulkTags,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Gắn các tag cho nhiều ghi chú; cặp (note, tag) đã có thì bỏ qua"""
+    note_ids = await _check_owned_notes(session, current_user.id, body.note_ids)
+    tags = await _load_tags(session, current_user.id, body.tag_ids)
+    # INSERT ... SELECT tích Descartes (note x tag) ngay trong database, không gửi từng cặp làm tham số
+    pairs = select(Note.id, Tag.id).where(Note.id.in_(note_ids), Tag.id.in_([tag.id for tag in tags]))
+    await session.execute(
+        insert(NoteTag).from_select(["note_id", "tag_id"], pairs).on_conflict_do_nothing()
+    )
+    await session.commit()
+    invalidate_public_notes(note_ids)
+    return schemas.NoteBulkResult(updated=len(note_ids))
+
+
+@router.post("/bulk/tags/remove", response_model=schemas.NoteBulkResult)
+async def bulk_remove_tags(
+    body: schemas.NoteBulkTags,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Gỡ các tag khỏi nhiều ghi chú"""
+    note_ids = await _check_owned_notes(session, current_user.id, body.note_ids)
+    await session.execute(
+        delete(NoteTag).where(NoteTag.note_id.in_(note_ids), NoteTag.tag_id.in_(set(body.tag_ids)))
+    )
+    await session.commit()
+    invalidate_public_notes(note_ids)
+    return schemas.NoteBulkResult(updated=len(note_ids))
+
+
+@router.post("/bulk/pin", response_model=schemas.NoteBulkResult)
+async def bulk_pin_notes(
+    body: schemas.NoteBulkPin,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    rows = await _bulk_update_notes(session, current_user.id, body.note_ids, {"is_pinned": body.is_pinned})
+    await session.commit()
+    return schemas.NoteBulkResult(updated=len(rows))
+
+
+@router.post("/bulk/trash", response_model=schemas.NoteBulkResult)
+async def bulk_trash_notes(
+    body: schemas.NoteBulkIds,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    rows = await _bulk_update_notes(session, current_user.id, body.note_ids, {"deleted_at": datetime.utcnow()})
+    await session.commit()
+    invalidate_public_notes(row.id for row in rows)
+    for row in rows:
+        reminder_scheduler.cancel(row.id)
+    return schemas.NoteBulkResult(updated=len(rows))
+
+
+@router.post("/bulk/restore", response_model=schemas.NoteBulkResult)
+async def bulk_restore_notes(
+    body: schemas.NoteBulkIds,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    rows = await _bulk_update_notes(session, current_user.id, body.note_ids, {"deleted_at": None}, trashed=True)
+    await session.commit()
+    invalidate_public_notes(row.id for row in rows)
+    for row in rows:
+        if row.reminder_at is not None and not row.reminder_sent:
+            reminder_scheduler.schedule(row.id, row.reminder_at)
+    return schemas.NoteBulkResult(updated=len(rows))
+
+
 @router.post("", response_model=schemas.NoteOut, status_code=status.HTTP_201_CREATED)
 async def create_note(
     note_in: schemas.NoteCreate,
@@ -149,15 +319,14 @@ async def create_note(
         tags=tags,
         color=note_in.color or "#ffffff",
         image_url=note_in.image_url,
+        image_variants=image_variant_urls(note_in.image_url),
     )
     session.add(note)
     await session.commit()
-    result = await session.execute(
-        select(Note)
-        .where(Note.id == note.id)
-        .options(selectinload(Note.tags), selectinload(Note.folder))
-    )
-    return result.scalar_one()
+    if note.reminder_at is not None:
+        reminder_scheduler.schedule(note.id, note.reminder_at)
+    # expire_on_commit=False: note và tags đã nạp vẫn dùng được, không cần SELECT lại sau commit
+    return note
 
 
 @router.patch("/{note_id}", response_model=schemas.NoteOut)
@@ -182,26 +351,28 @@ async def update_note(
         note.is_markdown = note_in.is_markdown
     if note_in.is_public is not None:
         note.is_public = note_in.is_public
-    if note_in.reminder_at is not None:
+    # reminder_at: null trong request nghĩa là bỏ nhắc nhở; chỉ đặt lại trạng thái khi thời gian thay đổi
+    reminder_changed = "reminder_at" in note_in.model_fields_set and note_in.reminder_at != note.reminder_at
+    if reminder_changed:
         note.reminder_at = note_in.reminder_at
-        note.reminder_sent = False if note_in.reminder_at else False
+        note.reminder_sent = False
+        note.reminder_claimed_until = None
     if note_in.is_pinned is not None:
         note.is_pinned = note_in.is_pinned
     if note_in.color is not None:
         note.color = note_in.color
     if note_in.image_url is not None:
         note.image_url = note_in.image_url
+        note.image_variants = image_variant_urls(note_in.image_url)
     if note_in.tag_ids is not None:
         note.tags = await _load_tags(session, current_user.id, note_in.tag_ids)
 
     session.add(note)
     await session.commit()
-    result = await session.execute(
-        select(Note)
-        .where(Note.id == note.id)
-        .options(selectinload(Note.tags), selectinload(Note.folder))
-    )
-    return result.scalar_one()
+    invalidate_public_note(note.id)
+    if reminder_changed:
+        reminder_scheduler.schedule(note.id, note.reminder_at)
+    return note
 
 
 @router.delete("/{note_id}", status_code=status.HTTP_200_OK)
@@ -217,6 +388,8 @@ async def delete_note(
     note.deleted_at = datetime.utcnow()
     session.add(note)
     await session.commit()
+    invalidate_public_note(note.id)
+    reminder_scheduler.cancel(note.id)
     return JSONResponse({"message": "Note moved to trash"}, status_code=status.HTTP_200_OK)
 
 
@@ -232,12 +405,10 @@ async def restore_note(
     note.deleted_at = None
     session.add(note)
     await session.commit()
-    result = await session.execute(
-        select(Note)
-        .where(Note.id == note.id)
-        .options(selectinload(Note.tags), selectinload(Note.folder))
-    )
-    return result.scalar_one()
+    invalidate_public_note(note.id)
+    if note.reminder_at is not None and not note.reminder_sent:
+        reminder_scheduler.schedule(note.id, note.reminder_at)
+    return note
 
 
 @router.delete("/{note_id}/force", status_code=status.HTTP_204_NO_CONTENT)
@@ -251,6 +422,7 @@ async def force_delete_note(
         raise HTTPException(status_code=404, detail="Note not found")
     await session.delete(note)
     await session.commit()
+    invalidate_public_note(note.id)
     return None
 
 
@@ -261,33 +433,41 @@ async def upload_image(
 ):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Chỉ cho phép tải lên ảnh")
+    # UploadSizeLimitMiddleware đã cắt body quá lớn trong lúc nhận; đây là giới hạn chính xác cho riêng file
+    if upload_size(file) > settings.upload_max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=upload_too_large_detail())
 
-    ext = os.path.splitext(file.filename)[1]
-    filename = f"{uuid4().hex}{ext}"
-
-    if settings.s3_enabled:
-        try:
-            url = await upload_image_to_s3(file, filename, file.content_type)
-            return {"url": url}
-        except Exception as exc:
-            raise HTTPException(status_code=500, detail=f"Upload S3 thất bại: {exc}")
-
-    _current_file = os.path.abspath(__file__)
-    _routers_dir = os.path.dirname(_current_file)  # Thư mục routers/
-    _app_dir = os.path.dirname(_routers_dir)  # Thư mục app/
-    _backend_dir = os.path.dirname(_app_dir)  # Thư mục backend/
-    _project_root = os.path.dirname(_backend_dir)  # Thư mục gốc
-    uploads_dir = os.path.join(_backend_dir, "uploads")
-    if not os.path.exists(uploads_dir):
-        uploads_dir = os.path.join(_project_root, "backend", "uploads")
-    os.makedirs(uploads_dir, exist_ok=True)
+    try:
+        stored = await store_image(file)
+    except InvalidImage:
+        raise HTTPException(status_code=400, detail="Không đọc được ảnh")
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=f"Upload thất bại: {exc}")
+    return stored
 
-    import aiofiles
-
-    file_path = os.path.join(uploads_dir, filename)
-    async with aiofiles.open(file_path, "wb") as f:
-        while chunk := await file.read(1024 * 1024):
-            await f.write(chunk)
-
-    return {"url": f"/uploads/{filename}"}
 
+@router.post("/import", response_model=schemas.NoteImportReport, status_code=status.HTTP_201_CREATED)
+async def import_notes_archive(
+    file: UploadFile = File(...),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Nhập hàng loạt ghi chú từ file .ndjson/.jsonl (mỗi dòng một object) hoặc .zip chứa file Markdown
+
+    Object NDJSON: title, content, is_markdown, is_pinned, color, folder ("a/b"), tags ([...]), created_at, updated_at.
+    Với zip, thư mục chứa file .md là folder; front matter (title:, tags:) là tùy chọn.
+    """
+    name = (file.filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        records = iter_ndjson(file)
+    elif name.endswith(".zip"):
+        records = iter_markdown_zip(file.file)
+    else:
+        raise HTTPException(status_code=400, detail="Chỉ hỗ trợ file .ndjson, .jsonl hoặc .zip")
+
+    try:
+        report = await import_notes(session, current_user.id, records, settings.import_batch_size)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="File zip không hợp lệ")
+    return report
@@ -1,32 +1,253 @@
-from typing import List
+import html
+import sys
+from typing import List, Literal, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from sqlalchemy import Float, and_, cast, func, literal, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from .. import schemas
-from ..database import get_session
-from ..deps import get_current_user
-from ..models import Note, User
+from ..core.config import settings
+from ..core.pagination import InvalidCursor, decode_cursor, encode_cursor
+from ..deps import get_current_user, get_user_read_session
+from ..models import SEARCH_TEXT_CONFIG, Note, User
+from ..queries import build_note_summaries, note_summary_columns, visible_notes_subquery
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+# ts_headline đánh dấu bằng ký tự điều khiển, sau đó escape HTML rồi mới đổi thành <mark>
+_HL_START, _HL_STOP = "\x02", "\x03"
+_HEADLINE_OPTIONS = f"StartSel={_HL_START}, StopSel={_HL_STOP}, MaxWords=35, MinWords=15, MaxFragments=2"
+
+# SQLSTATE khi câu query bị hủy do statement_timeout
+_QUERY_CANCELED = "57014"
+
+# pg_trgm cần ít nhất 3 ký tự để có trigram dùng được index
+_TRIGRAM_MIN_LENGTH = 3
+
+
+SearchScope = Literal["owned", "all"]
+
+
+def _scoped_notes(user_id: int, scope: SearchScope, columns, *criteria, order_by, limit: int):
+    """
+    Ghi chú chưa xóa khớp criteria trong phạm vi scope, dạng subquery
+
+    owned: chỉ ghi chú của user; all: thêm ghi chú được chia sẻ đã chấp nhận bằng một nhánh UNION ALL
+    trong cùng câu query (không phải OR ... IN, thứ làm mất index của nhánh ghi chú của user).
+    """
+    return visible_notes_subquery(
+        user_id, columns, *criteria, order_by=order_by, limit=limit, include_shared=scope == "all"
+    )
+
+
+def _search_query(q: str):
+    """websearch_to_tsquery theo cấu hình search của ứng dụng (unaccent + ngôn ngữ SEARCH_LANGUAGE)"""
+    return func.websearch_to_tsquery(cast(SEARCH_TEXT_CONFIG, REGCONFIG), q)
+
+
+def _search_rank(tsquery):
+    # search_document đã mang trọng số A (tiêu đề) / B (nội dung) nên xếp hạng không phải dựng lại tsvector
+    return func.ts_rank_cd(Note.search_vector, tsquery, type_=Float)
+
+
+def _ranked_notes(user_id: int, scope: SearchScope, tsquery, limit: int, after: Optional[tuple] = None):
+    """Subquery (id, rank) của `limit` ghi chú khớp tốt nhất, sau vị trí keyset (rank, id) nếu có"""
+    rank = _search_rank(tsquery)
+    criteria = [Note.search_vector.op("@@")(tsquery)]
+    if after is not None:
+        criteria.append(tuple_(rank, Note.id) < tuple_(*after))
+    return _scoped_notes(
+        user_id, scope, (Note.id, rank.label("rank")), *criteria, order_by=(rank.desc(), Note.id.desc()), limit=limit
+    )
+
+
+def _render_snippet(snippet: Optional[str]) -> str:
+    return html.escape(snippet or "").replace(_HL_START, "<mark>").replace(_HL_STOP, "</mark>")
+
 
 @router.get("", response_model=List[schemas.NoteOut])
 async def search_notes(
     q: str = Query(..., min_length=2),
-    session: AsyncSession = Depends(get_session),
+    scope: SearchScope = "owned",
+    session: AsyncSession = Depends(get_user_read_session),
     current_user: User = Depends(get_current_user),
 ):
+    matching = _scoped_notes(
+        current_user.id,
+        scope,
+        (Note.id, Note.updated_at),
+        Note.search_vector.op("@@")(_search_query(q)),
+        order_by=(Note.updated_at.desc(),),
+        limit=50,
+    )
     query = (
         select(Note)
-        .where(Note.user_id == current_user.id)
-        .where(Note.search_vector.match(q, postgresql_regconfig="english"))
+        .join(matching, matching.c.id == Note.id)
         .options(selectinload(Note.tags))
-        .order_by(Note.updated_at.desc())
+        .order_by(matching.c.updated_at.desc())
         .limit(50)
     )
     result = await session.execute(query)
     return result.scalars().all()
 
+
+@router.get("/summary", response_model=List[schemas.NoteSummaryOut])
+async def search_notes_summary(
+    q: str = Query(..., min_length=2),
+    scope: SearchScope = "owned",
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    matching = _scoped_notes(
+        current_user.id,
+        scope,
+        (Note.id, Note.updated_at),
+        Note.search_vector.op("@@")(_search_query(q)),
+        order_by=(Note.updated_at.desc(),),
+        limit=50,
+    )
+    query = (
+        select(*note_summary_columns())
+        .join(matching, matching.c.id == Note.id)
+        .order_by(matching.c.updated_at.desc())
+        .limit(50)
+    )
+    result = await session.execute(query)
+    return await build_note_summaries(session, result.all())
+
+
+@router.get("/page", response_model=schemas.SearchPage)
+async def search_notes_page(
+    q: str = Query(..., min_length=2),
+    scope: SearchScope = "owned",
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Tìm kiếm xếp hạng theo ts_rank_cd (tiêu đề nặng hơn nội dung), phân trang keyset (rank, id)
+
+    Trả về đoạn trích ts_headline (đã escape HTML, từ khớp bọc trong <mark>) thay cho toàn bộ nội dung.
+    scope=all tìm cả ghi chú được chia sẻ cho user (user_id của kết quả cho biết chủ sở hữu).
+    """
+    regconfig = cast(SEARCH_TEXT_CONFIG, REGCONFIG)
+    tsquery = _search_query(q)
+    after = None
+    if cursor:
+        try:
+            last_rank, last_id = decode_cursor(cursor, 2)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not isinstance(last_rank, (int, float)) or not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (last_rank, last_id)
+    ranked = _ranked_notes(current_user.id, scope, tsquery, limit + 1, after)
+
+    # ts_headline chỉ chạy trên các dòng của trang hiện tại
+    result = await session.execute(
+        select(
+            Note.id,
+            Note.user_id,
+            Note.title,
+            func.ts_headline(regconfig, Note.content, tsquery, _HEADLINE_OPTIONS).label("snippet"),
+            ranked.c.rank,
+            Note.is_markdown,
+            Note.folder_id,
+            Note.color,
+            Note.image_url,
+            Note.image_variants,
+            Note.is_pinned,
+            Note.created_at,
+            Note.updated_at,
+        )
+        .join(ranked, ranked.c.id == Note.id)
+        .order_by(ranked.c.rank.desc(), Note.id.desc())
+        .limit(limit + 1)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].rank, rows[-1].id])
+
+    items = await build_note_summaries(session, rows)
+    for item in items:
+        item["snippet"] = _render_snippet(item["snippet"])
+    return schemas.SearchPage(items=items, next_cursor=next_cursor)
+
+
+def _title_prefix(q: str):
+    """lower(title) bắt đầu bằng q, viết dạng khoảng [q, q+1) để dùng được ix_notes_user_title_prefix"""
+    lowered = q.lower()
+    title = func.lower(Note.title)
+    criteria = [title.op("~>=~")(lowered)]
+    if ord(lowered[-1]) < sys.maxunicode:
+        criteria.append(title.op("~<~")(lowered[:-1] + chr(ord(lowered[-1]) + 1)))
+    return and_(*criteria)
+
+
+def _suggest_query(user_id: int, q: str, limit: int):
+    """Gợi ý tiêu đề cho q (đã strip, khác rỗng) trong phạm vi ghi chú user được xem"""
+    if len(q) < _TRIGRAM_MIN_LENGTH:
+        match = _title_prefix(q)
+    else:
+        # q <% title: word_similarity(q, title) vượt ngưỡng pg_trgm.word_similarity_threshold (mặc định 0.6)
+        match = or_(Note.title.icontains(q, autoescape=True), literal(q).op("<%")(Note.title))
+    starts = Note.title.istartswith(q, autoescape=True)
+    similarity = func.word_similarity(q, Note.title, type_=Float)
+    candidates = visible_notes_subquery(
+        user_id,
+        (
+            Note.id,
+            Note.title,
+            Note.folder_id,
+            Note.is_pinned,
+            Note.updated_at,
+            starts.label("starts"),
+            similarity.label("similarity"),
+        ),
+        match,
+        order_by=(starts.desc(), similarity.desc(), Note.updated_at.desc()),
+        limit=limit,
+    )
+    return (
+        select(candidates.c.id, candidates.c.title, candidates.c.folder_id, candidates.c.is_pinned, candidates.c.updated_at)
+        .order_by(candidates.c.starts.desc(), candidates.c.similarity.desc(), candidates.c.updated_at.desc())
+        .limit(limit)
+    )
+
+
+@router.get("/suggest", response_model=List[schemas.NoteSuggestion])
+async def suggest_notes(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    session: AsyncSession = Depends(get_user_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Gợi ý tiêu đề khi đang gõ: khớp một phần (ILIKE) hoặc gần đúng (trigram word_similarity)
+
+    Cùng phạm vi với list_notes (ghi chú của user + được chia sẻ). Ghi chú của user đi qua index GIN
+    ix_notes_user_title_trgm (user_id, title); q ngắn hơn một trigram chỉ khớp prefix qua ix_notes_user_title_prefix.
+    Mỗi lần gọi bị giới hạn SEARCH_SUGGEST_TIMEOUT_MS; quá hạn trả về [] thay vì làm chậm ô tìm kiếm.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    query = _suggest_query(current_user.id, q, limit)
+    await session.execute(text(f"SET LOCAL statement_timeout = {int(settings.search_suggest_timeout_ms)}"))
+    try:
+        result = await session.execute(query)
+    except DBAPIError as exc:
+        if getattr(exc.orig, "sqlstate", None) != _QUERY_CANCELED:
+            raise
+        # Hết thời gian: gợi ý là phụ, trả về rỗng để client gõ tiếp
+        await session.rollback()
+        return []
+    return [schemas.NoteSuggestion.model_validate(row._mapping) for row in result.all()]
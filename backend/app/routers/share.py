@@ -1,16 +1,25 @@
 from datetime import datetime, timedelta, timezone
+from email.utils import parsedate
 from typing import List
 import secrets
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 
 from .. import schemas
+from ..core.config import settings
 from ..database import get_session
-from ..deps import get_current_user
+from ..deps import get_current_user, get_user_read_session
 from ..models import Note, ShareLink, User, NoteShare
+from ..share_cache import (
+    PublicShareEntry,
+    build_public_share_entry,
+    cache_public_share,
+    get_public_share,
+    share_generation,
+)
 
 router = APIRouter(prefix="/share", tags=["share"])
 
@@ -41,16 +50,50 @@ async def create_share_link(
     return schemas.ShareLinkOut(token=token, expires_at=expires_at, url=url)
 
 
+def _public_share_response(entry: PublicShareEntry, request: Request) -> Response:
+    """Trả payload đã render (hoặc 304) kèm ETag/Last-Modified để trình duyệt và CDN cache lại"""
+    max_age = settings.public_share_max_age_seconds
+    if entry.expires_at is not None:
+        max_age = min(max_age, int((entry.expires_at - datetime.now(timezone.utc)).total_seconds()))
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": f"public, max-age={max(max_age, 0)}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        not_modified = "*" in tags or entry.etag in tags
+    else:
+        if_modified_since = parsedate(request.headers.get("if-modified-since", ""))
+        not_modified = if_modified_since is not None and if_modified_since >= parsedate(entry.last_modified)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("/public/{token}", response_model=schemas.PublicNoteOut)
 async def read_shared_note(
     token: str,
+    request: Request,
     session: AsyncSession = Depends(get_session),
 ):
-    """Đọc ghi chú qua share token công khai"""
+    """
+    Đọc ghi chú qua share token công khai (payload được cache theo token, hỗ trợ 304)
+
+    Cache miss đọc từ primary chứ không từ replica: ngay sau invalidate_public_note, replica còn trễ
+    có thể trả nội dung cũ và nội dung đó sẽ nằm lại trong cache suốt PUBLIC_SHARE_CACHE_TTL_SECONDS.
+    """
+    entry = get_public_share(token)
+    if entry is not None:
+        return _public_share_response(entry, request)
+
+    generation = share_generation()
     result = await session.execute(
         select(ShareLink)
         .where(ShareLink.token == token)
-        .options(selectinload(ShareLink.note).selectinload(Note.tags))
+        .options(joinedload(ShareLink.note).selectinload(Note.tags))
     )
     link = result.scalar_one_or_none()
     if not link:
@@ -65,7 +108,7 @@ async def read_shared_note(
     if not link.is_public:
         raise HTTPException(status_code=403, detail="This link is private")
 
-    return schemas.PublicNoteOut(
+    payload = schemas.PublicNoteOut(
         id=note.id,
         title=note.title,
         content=note.content,
@@ -78,6 +121,9 @@ async def read_shared_note(
         updated_at=note.updated_at,
         tags=note.tags,
     )
+    entry = build_public_share_entry(note.id, payload.model_dump_json().encode(), link.expires_at)
+    cache_public_share(token, entry, generation)
+    return _public_share_response(entry, request)
 
 
 @router.post("/notes/{note_id}/user", response_model=schemas.ShareRequestOut, status_code=status.HTTP_201_CREATED)
@@ -139,7 +185,7 @@ async def share_note_with_user(
 
 @router.get("/requests/pending", response_model=List[schemas.ShareRequestOut])
 async def get_pending_shares(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_read_session),
     current_user: User = Depends(get_current_user),
 ):
     """Lấy danh sách share requests đang chờ (nhận được)"""
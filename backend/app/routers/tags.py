@@ -6,14 +6,14 @@ from sqlalchemy import select
 
 from .. import schemas
 from ..database import get_session
-from ..deps import get_current_user
+from ..deps import get_current_user, get_user_read_session
 from ..models import Tag, User
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
 
 @router.get("", response_model=List[schemas.TagOut])
-async def list_tags(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def list_tags(session: AsyncSession = Depends(get_user_read_session), current_user: User = Depends(get_current_user)):
     result = await session.execute(select(Tag).where(Tag.user_id == current_user.id))
     return result.scalars().all()
 
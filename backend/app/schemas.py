@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -12,6 +12,7 @@ class Token(BaseModel):
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
+    uid: Optional[int] = None
 
 
 class UserBase(BaseModel):
@@ -101,14 +102,136 @@ class NoteOut(NoteBase):
     is_pinned: bool = False
     tags: List[TagOut] = Field(default_factory=list)
     deleted_at: Optional[datetime] = None
+    image_variants: Optional[Dict[str, str]] = None
 
     model_config = {"from_attributes": True}
 
 
+class NoteBulkIds(BaseModel):
+    note_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+
+class NoteBulkMove(NoteBulkIds):
+    folder_id: Optional[int] = None
+
+
+class NoteBulkTags(NoteBulkIds):
+    tag_ids: List[int] = Field(..., min_length=1, max_length=50)
+
+
+class NoteBulkPin(NoteBulkIds):
+    is_pinned: bool
+
+
+class NoteBulkResult(BaseModel):
+    updated: int
+
+
+class NoteImportReport(BaseModel):
+    notes_created: int
+    folders_created: int
+    tags_created: int
+    skipped: int
+    errors: List[str] = Field(default_factory=list)
+    seconds: float
+    rows_per_second: float
+
+
+class NotePage(BaseModel):
+    items: List[NoteOut]
+    next_cursor: Optional[str] = None
+
+
+class NoteSummaryOut(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    excerpt: str = ""
+    is_markdown: bool = True
+    folder_id: Optional[int] = None
+    color: Optional[str] = None
+    image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
+    is_pinned: bool = False
+    is_public: bool = False
+    reminder_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+    deleted_at: Optional[datetime] = None
+    tags: List[TagOut] = Field(default_factory=list)
+
+
+class NoteSummaryPage(BaseModel):
+    items: List[NoteSummaryOut]
+    next_cursor: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    snippet: str = ""
+    rank: float
+    is_markdown: bool = True
+    folder_id: Optional[int] = None
+    color: Optional[str] = None
+    image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
+    is_pinned: bool = False
+    created_at: datetime
+    updated_at: datetime
+    tags: List[TagOut] = Field(default_factory=list)
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+
+class NoteSuggestion(BaseModel):
+    id: int
+    title: str
+    folder_id: Optional[int] = None
+    is_pinned: bool = False
+    updated_at: datetime
+
+
 class SearchResult(BaseModel):
     notes: List[NoteOut]
 
 
+class UploadPresignRequest(BaseModel):
+    filename: str = Field(..., max_length=255)
+    content_type: str = Field(..., max_length=100)
+    size: int = Field(..., gt=0)
+
+
+class UploadPresignOut(BaseModel):
+    upload_id: int
+    method: str  # POST (S3, multipart form với fields) | PUT (local, body là nội dung file)
+    url: str
+    fields: Dict[str, str] = Field(default_factory=dict)
+    headers: Dict[str, str] = Field(default_factory=dict)
+    expires_at: datetime
+
+
+class UploadCompleteRequest(BaseModel):
+    note_id: Optional[int] = None
+
+
+class UploadOut(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size: Optional[int] = None
+    url: Optional[str] = None
+    status: str
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+
 class ShareLinkCreate(BaseModel):
     expires_in_minutes: Optional[int] = Field(default=None, ge=5, le=60 * 24 * 30)
     is_public: bool = True
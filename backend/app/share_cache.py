@@ -0,0 +1,111 @@
+"""
+Cache trong process cho trang chia sẻ công khai: payload JSON đã render sẵn theo share token
+
+Mỗi khi ghi chú thay đổi (sửa, đổi tag, chuyển vào/ra thùng rác, xóa) phải gọi invalidate_public_note.
+Link có hạn được cache không quá thời điểm hết hạn.
+
+Cache miss ghi lại share_generation() trước khi đọc database; nếu ghi chú bị invalidate trong lúc đọc
+thì cache_public_share bỏ qua payload (có thể đã cũ) thay vì giữ nó tới hết TTL.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate
+from typing import Dict, Iterable, Optional, Set
+
+from .core.cache import TTLCache
+from .core.config import settings
+
+
+@dataclass(frozen=True)
+class PublicShareEntry:
+    note_id: int
+    body: bytes
+    etag: str
+    last_modified: str
+    expires_at: Optional[datetime]
+
+
+# note_id -> các token đang nằm trong cache, để invalidate theo ghi chú
+_tokens_by_note: Dict[int, Set[str]] = {}
+
+# Bộ đếm tăng mỗi lần invalidate; note_id -> giá trị bộ đếm ở lần invalidate gần nhất (cũ nhất ở đầu)
+_MAX_TRACKED_INVALIDATIONS = 10000
+_generation = 0
+_invalidated_at: "OrderedDict[int, int]" = OrderedDict()
+# Giá trị của note bị loại gần nhất khỏi _invalidated_at: note không còn trong map được coi như
+# bị invalidate muộn nhất ở thời điểm này (an toàn: chỉ làm mất một lần ghi cache)
+_forgotten_generation = 0
+
+
+def _forget_token(token: str, entry: PublicShareEntry) -> None:
+    tokens = _tokens_by_note.get(entry.note_id)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del _tokens_by_note[entry.note_id]
+
+
+# Entry bị loại do TTL/LRU cũng được gỡ khỏi _tokens_by_note, nên map không lớn hơn cache
+public_share_cache = TTLCache(
+    maxsize=settings.public_share_cache_max_size,
+    ttl=settings.public_share_cache_ttl_seconds,
+    on_evict=_forget_token,
+)
+
+
+def build_public_share_entry(note_id: int, body: bytes, expires_at: Optional[datetime]) -> PublicShareEntry:
+    """
+    Last-Modified là thời điểm render payload: entry chỉ được dựng lại sau khi hết hạn hoặc bị invalidate,
+    nên mọi thay đổi của ghi chú đều cho Last-Modified mới hơn (ETag theo nội dung vẫn là điều kiện chính)
+    """
+    return PublicShareEntry(
+        note_id=note_id,
+        body=body,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        last_modified=formatdate(time.time(), usegmt=True),
+        expires_at=expires_at,
+    )
+
+
+def get_public_share(token: str) -> Optional[PublicShareEntry]:
+    entry = public_share_cache.get(token)
+    if entry is not None and entry.expires_at is not None and entry.expires_at <= datetime.now(timezone.utc):
+        public_share_cache.pop(token)
+        _forget_token(token, entry)
+        return None
+    return entry
+
+
+def share_generation() -> int:
+    """Gọi trước khi đọc database cho một cache miss, truyền lại cho cache_public_share"""
+    return _generation
+
+
+def cache_public_share(token: str, entry: PublicShareEntry, generation: int) -> None:
+    if _invalidated_at.get(entry.note_id, _forgotten_generation) > generation:
+        # Ghi chú bị invalidate sau khi bắt đầu đọc: payload có thể là bản trước thay đổi
+        return
+    ttl = settings.public_share_cache_ttl_seconds
+    if entry.expires_at is not None:
+        ttl = min(ttl, (entry.expires_at - datetime.now(timezone.utc)).total_seconds())
+    public_share_cache.set(token, entry, ttl=ttl)
+    _tokens_by_note.setdefault(entry.note_id, set()).add(token)
+
+
+def invalidate_public_note(note_id: int) -> None:
+    global _generation, _forgotten_generation
+    _generation += 1
+    _invalidated_at[note_id] = _generation
+    _invalidated_at.move_to_end(note_id)
+    if len(_invalidated_at) > _MAX_TRACKED_INVALIDATIONS:
+        _, _forgotten_generation = _invalidated_at.popitem(last=False)
+    for token in _tokens_by_note.pop(note_id, ()):
+        public_share_cache.pop(token)
+
+
+def invalidate_public_notes(note_ids: Iterable[int]) -> None:
+    for note_id in note_ids:
+        invalidate_public_note(note_id)
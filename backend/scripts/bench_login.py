@@ -0,0 +1,109 @@
+"""
+Benchmark đăng nhập: p99 của một endpoint không liên quan (mặc định GET /) khi không tải và khi có
+nhiều request /auth/token đồng thời. bcrypt chạy ngoài event loop thì p99 của endpoint kia phải giữ ổn định.
+
+Chạy với server đang chạy (uvicorn app.main:app), chỉ dùng thư viện chuẩn:
+    python -m scripts.bench_login --url http://localhost:8000 --concurrency 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+async def request(url: str, method: str = "GET", body: bytes = b"", content_type: str = "") -> Tuple[int, float]:
+    """Một request HTTP/1.1 (Connection: close), trả về (status, thời gian ms)"""
+    parts = urlsplit(url)
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), ssl=parts.scheme == "https"
+    )
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close", f"Content-Length: {len(body)}"]
+    if content_type:
+        lines.append(f"Content-Type: {content_type}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1]), (time.perf_counter() - started) * 1000
+
+
+def summarize(name: str, timings: List[float]) -> None:
+    if len(timings) < 2:
+        print(f"{name:24} không đủ mẫu")
+        return
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    print(
+        f"{name:24} n={len(timings):<6} p50={quantiles[49]:8.2f}ms  p95={quantiles[94]:8.2f}ms  "
+        f"p99={quantiles[98]:8.2f}ms  max={max(timings):8.2f}ms"
+    )
+
+
+async def probe(url: str, interval: float, stop: asyncio.Event) -> List[float]:
+    timings = []
+    while not stop.is_set():
+        _, elapsed = await request(url)
+        timings.append(elapsed)
+        await asyncio.sleep(interval)
+    return timings
+
+
+async def login_worker(url: str, form: bytes, stop: asyncio.Event, timings: List[float], statuses: dict) -> None:
+    while not stop.is_set():
+        status, elapsed = await request(url, "POST", form, "application/x-www-form-urlencoded")
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            timings.append(elapsed)
+
+
+async def run_for(seconds: float, stop: asyncio.Event) -> None:
+    await asyncio.sleep(seconds)
+    stop.set()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.02, help="giây giữa hai lần probe")
+    parser.add_argument("--concurrency", type=int, default=32, help="số request đăng nhập đồng thời")
+    parser.add_argument("--duration", type=float, default=10, help="giây cho mỗi giai đoạn")
+    parser.add_argument("--email", default="bench-login@bench.invalid")
+    parser.add_argument("--password", default="bench-login-password")
+    args = parser.parse_args()
+
+    base = args.url.rstrip("/")
+    probe_url = f"{base}{args.probe_path}"
+    register = json.dumps({"email": args.email, "username": "bench-login", "password": args.password}).encode()
+    status, _ = await request(f"{base}/auth/register", "POST", register, "application/json")
+    if status not in (201, 400):
+        raise SystemExit(f"Không tạo được user benchmark (HTTP {status})")
+    form = urlencode({"username": args.email, "password": args.password}).encode()
+
+    stop = asyncio.Event()
+    baseline, _ = await asyncio.gather(probe(probe_url, args.probe_interval, stop), run_for(args.duration, stop))
+
+    stop = asyncio.Event()
+    login_timings: List[float] = []
+    statuses: dict = {}
+    results = await asyncio.gather(
+        probe(probe_url, args.probe_interval, stop),
+        run_for(args.duration, stop),
+        *[login_worker(f"{base}/auth/token", form, stop, login_timings, statuses) for _ in range(args.concurrency)],
+    )
+    under_load = results[0]
+
+    print(f"Probe {args.probe_path}, {args.concurrency} login đồng thời trong {args.duration:g}s")
+    summarize(f"{args.probe_path} không tải", baseline)
+    summarize(f"{args.probe_path} khi đăng nhập", under_load)
+    summarize("/auth/token (200)", login_timings)
+    print(f"Đăng nhập thành công: {len(login_timings) / args.duration:.1f}/s, theo status: {statuses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+Đếm số câu SQL (round-trip) và thời gian của create/update/restore ghi chú, gọi thẳng handler trên dữ liệu seed
+
+"trước" là handler cộng thêm câu SELECT lại note kèm selectinload(tags, folder) sau commit mà các handler
+từng chạy; "hiện tại" là handler như trong code. Query của get_current_user không được tính.
+
+Chạy trên database thử nghiệm, từ thư mục backend:
+    DATABASE_URL=postgresql+asyncpg://... JWT_SECRET_KEY=x python -m scripts.bench_note_writes
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from functools import partial
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import selectinload
+
+from app import schemas
+from app.database import engine, AsyncSessionLocal
+from app.models import Folder, Note, Tag, User
+from app.routers.notes import create_note, delete_note, restore_note, update_note
+from scripts.dataset import prepare_schema, sample_user_ids, seed
+
+
+class StatementCounter:
+    """Đếm câu lệnh gửi xuống database qua before_cursor_execute của engine"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+async def reselect(session, note_id: int) -> None:
+    """Câu SELECT sau commit đã bỏ khỏi create/update/restore"""
+    result = await session.execute(
+        select(Note).where(Note.id == note_id).options(selectinload(Note.tags), selectinload(Note.folder))
+    )
+    result.scalar_one()
+
+
+async def bench_fixtures(user_id: int) -> tuple:
+    """Folder đầu tiên và hai tag của user benchmark (tạo tag nếu chưa có)"""
+    async with engine.begin() as conn:
+        folder_id = await conn.scalar(select(Folder.id).where(Folder.user_id == user_id).order_by(Folder.id).limit(1))
+        names = ["bench-tag-1", "bench-tag-2"]
+        await conn.execute(
+            insert(Tag).values([{"name": name, "user_id": user_id} for name in names]).on_conflict_do_nothing()
+        )
+        tag_ids = (await conn.scalars(select(Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names)))).all()
+    return folder_id, list(tag_ids)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes-per-user", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    await prepare_schema(engine)
+    await seed(engine, args.users, args.notes_per_user)
+    (user_id,) = await sample_user_ids(engine, 1)
+    folder_id, tag_ids = await bench_fixtures(user_id)
+    counter = StatementCounter()
+    # (thao tác, kiểu đo) -> danh sách (số câu lệnh, ms)
+    samples: Dict[tuple, List[tuple]] = {}
+    created: List[int] = []
+
+    async def request(handler: Callable[..., Awaitable], mode: str):
+        """Một request: session riêng như Depends(get_session), chỉ đo phần handler (và SELECT lại nếu "trước")"""
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, user_id)
+            before = counter.count
+            started = time.perf_counter()
+            note = await handler(session=session, current_user=user)
+            if mode == "trước":
+                await reselect(session, note.id)
+            return note, (counter.count - before, (time.perf_counter() - started) * 1000)
+
+    for i in range(args.iterations):
+        for mode in ("hiện tại", "trước"):
+            note_in = schemas.NoteCreate(title=f"Bench {i}", content="nội dung", folder_id=folder_id, tag_ids=tag_ids)
+            note, sample = await request(partial(create_note, note_in), mode)
+            created.append(note.id)
+            samples.setdefault(("create", mode), []).append(sample)
+
+            update_in = schemas.NoteUpdate(title=f"Bench {i} (sửa)", tag_ids=tag_ids[:1])
+            _, sample = await request(partial(update_note, note.id, update_in), mode)
+            samples.setdefault(("update", mode), []).append(sample)
+
+            async with AsyncSessionLocal() as session:
+                await delete_note(note.id, session=session, current_user=await session.get(User, user_id))
+            _, sample = await request(partial(restore_note, note.id), mode)
+            samples.setdefault(("restore", mode), []).append(sample)
+
+    async with engine.begin() as conn:
+        await conn.execute(delete(Note).where(Note.id.in_(created)))
+    await engine.dispose()
+
+    print(f"{args.iterations} lần mỗi thao tác (user {user_id}, {len(tag_ids)} tag)")
+    for operation in ("create", "update", "restore"):
+        for mode in ("trước", "hiện tại"):
+            runs = samples[(operation, mode)]
+            statements = statistics.mean(count for count, _ in runs)
+            timings = [elapsed for _, elapsed in runs]
+            print(
+                f"{operation:8} {mode:9} {statements:5.1f} câu lệnh/request  "
+                f"p50={statistics.median(timings):7.2f}ms  max={max(timings):7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Benchmark gửi nhắc nhở: dispatch_due_reminders với mailer giả (mỗi email tốn --latency-ms) ở nhiều mức
+REMINDER_CONCURRENCY, in số nhắc nhở/giây. Trước mỗi lần chạy, các nhắc nhở đã seed được đặt lại là chưa gửi.
+
+Chạy trên database thử nghiệm, từ thư mục backend:
+    DATABASE_URL=postgresql+asyncpg://... JWT_SECRET_KEY=x python -m scripts.bench_reminders --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.database import engine, AsyncSessionLocal
+from app.models import Note
+from app.reminder import dispatch_due_reminders
+from scripts.dataset import prepare_schema, seed
+
+
+def fake_mailer(latency: float):
+    async def send(**kwargs) -> bool:
+        if latency:
+            await asyncio.sleep(latency)
+        return True
+
+    return send
+
+
+async def reset_reminders() -> int:
+    """Đặt lại mọi nhắc nhở là chưa gửi, trả về số nhắc nhở đang đến hạn"""
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(Note)
+            .where(Note.reminder_at.is_not(None))
+            .values(reminder_sent=False, reminder_claimed_until=None)
+        )
+        return await conn.scalar(
+            select(func.count()).where(
+                Note.reminder_at <= datetime.now(timezone.utc), Note.deleted_at.is_(None)
+            )
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes-per-user", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=settings.reminder_batch_size)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="các mức email song song")
+    parser.add_argument("--latency-ms", type=float, default=5, help="thời gian giả lập cho mỗi email (0 = no-op)")
+    args = parser.parse_args()
+
+    await prepare_schema(engine)
+    await seed(engine, args.users, args.notes_per_user)
+    send = fake_mailer(args.latency_ms / 1000)
+
+    print(f"Lô {args.batch_size} nhắc nhở, mailer giả {args.latency_ms:g}ms/email")
+    for concurrency in args.concurrency:
+        due = await reset_reminders()
+        started = time.perf_counter()
+        sent = await dispatch_due_reminders(AsyncSessionLocal, args.batch_size, concurrency, send=send)
+        elapsed = time.perf_counter() - started
+        print(
+            f"concurrency={concurrency:<4} đến hạn={due:<6} đã gửi={sent:<6} "
+            f"{elapsed:8.2f}s  {sent / elapsed if elapsed else 0:10.1f} nhắc nhở/s"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Log từng lô của app.reminder làm nhiễu kết quả
+    logging.getLogger("app.reminder").setLevel(logging.WARNING)
+    asyncio.run(main())
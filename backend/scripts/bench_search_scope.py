@@ -0,0 +1,99 @@
+"""
+Benchmark search scope=all: một câu query (UNION ALL trong _ranked_notes) so với hai câu query riêng
+(ghi chú của user rồi ghi chú được chia sẻ, gộp và cắt trang ở Python)
+
+Chạy trên database thử nghiệm, từ thư mục backend:
+    DATABASE_URL=postgresql+asyncpg://... JWT_SECRET_KEY=x python -m scripts.bench_search_scope
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from sqlalchemy import select
+
+from app.database import engine, AsyncSessionLocal
+from app.models import Note, NoteShare
+from app.routers.search import _ranked_notes, _search_query, _search_rank
+from scripts.dataset import WORDS, prepare_schema, sample_user_ids, seed
+
+
+async def one_query(session, user_id: int, q: str, limit: int) -> list:
+    ranked = _ranked_notes(user_id, "all", _search_query(q), limit)
+    result = await session.execute(
+        select(ranked.c.id, ranked.c.rank).order_by(ranked.c.rank.desc(), ranked.c.id.desc()).limit(limit)
+    )
+    return result.all()
+
+
+async def two_queries(session, user_id: int, q: str, limit: int) -> list:
+    tsquery = _search_query(q)
+    owned = _ranked_notes(user_id, "owned", tsquery, limit)
+    owned_rows = (await session.execute(select(owned.c.id, owned.c.rank))).all()
+    rank = _search_rank(tsquery)
+    shared_rows = (
+        await session.execute(
+            select(Note.id, rank.label("rank"))
+            .join(NoteShare, NoteShare.note_id == Note.id)
+            .where(
+                NoteShare.shared_with_user_id == user_id,
+                NoteShare.status == "accepted",
+                Note.user_id != user_id,
+                Note.deleted_at.is_(None),
+                Note.search_vector.op("@@")(tsquery),
+            )
+            .order_by(rank.desc(), Note.id.desc())
+            .limit(limit)
+        )
+    ).all()
+    return sorted(owned_rows + shared_rows, key=lambda row: (row.rank, row.id), reverse=True)[:limit]
+
+
+async def measure(name: str, run, user_ids: list, iterations: int, limit: int) -> None:
+    timings = []
+    async with AsyncSessionLocal() as session:
+        for i in range(iterations):
+            user_id = user_ids[i % len(user_ids)]
+            q = random.choice(WORDS)
+            started = time.perf_counter()
+            await run(session, user_id, q, limit)
+            timings.append((time.perf_counter() - started) * 1000)
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    print(
+        f"{name:12} n={iterations}  p50={quantiles[49]:.2f}ms  p95={quantiles[94]:.2f}ms  "
+        f"p99={quantiles[98]:.2f}ms  max={max(timings):.2f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes-per-user", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=21)
+    args = parser.parse_args()
+
+    await prepare_schema(engine)
+    await seed(engine, args.users, args.notes_per_user)
+    user_ids = await sample_user_ids(engine, 20)
+
+    # Kiểm tra hai cách cho cùng kết quả trước khi đo
+    async with AsyncSessionLocal() as session:
+        for user_id in user_ids[:5]:
+            for q in WORDS:
+                one = [row.id for row in await one_query(session, user_id, q, args.limit)]
+                two = [row.id for row in await two_queries(session, user_id, q, args.limit)]
+                assert one == two, f"Kết quả khác nhau cho user {user_id}, q={q!r}"
+
+    # Làm nóng cache của Postgres và prepared statement
+    await measure("warmup", one_query, user_ids, 50, args.limit)
+    await measure("one query", one_query, user_ids, args.iterations, args.limit)
+    await measure("two queries", two_queries, user_ids, args.iterations, args.limit)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main())
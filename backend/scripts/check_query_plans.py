@@ -0,0 +1,128 @@
+"""
+Kiểm tra EXPLAIN của các query nóng trên dữ liệu lớn: mỗi query phải đi qua index mong đợi và không
+Seq Scan trên notes/note_shares. Thoát với mã 1 nếu có query không đạt (dùng được trong CI).
+
+Chạy trên database thử nghiệm, từ thư mục backend:
+    DATABASE_URL=postgresql+asyncpg://... JWT_SECRET_KEY=x python -m scripts.check_query_plans
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence, Tuple
+
+from sqlalchemy import select
+
+from app.core.pagination import encode_cursor
+from app.database import engine
+from app.models import Folder, Note
+from app.purge import _purge_batch_statement
+from app.reminder import _claim_statement
+from app.routers.notes import _trash_query, _visible_notes_query
+from app.routers.search import _ranked_notes, _search_query, _suggest_query
+from scripts.dataset import WORDS, prepare_schema, sample_user_ids, seed
+
+# Bảng không được phép Seq Scan trong các query dưới đây
+_WATCHED_TABLES = ("notes", "note_shares")
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def explain(conn, statement) -> dict:
+    """EXPLAIN (FORMAT JSON), không thực thi nên an toàn cho cả UPDATE/DELETE"""
+    compiled = statement.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", params)
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def check_plan(plan: dict, required: Sequence[Tuple[str, ...]]) -> List[str]:
+    """Các lỗi của plan: Seq Scan trên bảng theo dõi, hoặc nhóm index mong đợi không có index nào được dùng"""
+    problems = []
+    used = set()
+    for node in plan_nodes(plan):
+        if "Index Name" in node:
+            used.add(node["Index Name"])
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in _WATCHED_TABLES:
+            problems.append(f"Seq Scan trên {node['Relation Name']}")
+    for choices in required:
+        if used.isdisjoint(choices):
+            problems.append(f"không dùng {' / '.join(choices)} (đã dùng: {', '.join(sorted(used)) or 'không index nào'})")
+    return problems
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes-per-user", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    await prepare_schema(engine)
+    await seed(engine, args.users, args.notes_per_user)
+    (user_id,) = await sample_user_ids(engine, 1)
+    async with engine.connect() as conn:
+        folder_id = await conn.scalar(select(Folder.id).where(Folder.user_id == user_id).limit(1))
+
+    now = datetime.now(timezone.utc)
+    limit = args.page_size + 1
+    cursor = encode_cursor([False, now - timedelta(days=1), 2**31 - 1])
+    tsquery = _search_query(WORDS[0])
+    shares = ("ix_note_shares_recipient_status",)
+    checks = [
+        ("list", _visible_notes_query(select(Note.id), user_id, None), [("ix_notes_user_active",), shares]),
+        ("page", _visible_notes_query(select(Note.id), user_id, None, None, limit), [("ix_notes_user_active",), shares]),
+        (
+            "page (cursor)",
+            _visible_notes_query(select(Note.id), user_id, None, cursor, limit),
+            [("ix_notes_user_active",), shares],
+        ),
+        (
+            "page (folder)",
+            _visible_notes_query(select(Note.id), user_id, folder_id, cursor, limit),
+            [("ix_notes_user_folder_active",)],
+        ),
+        ("trash", _trash_query(select(Note.id), user_id).limit(limit), [("ix_notes_user_trash",)]),
+        # search_document không theo user: chấp nhận GIN toàn cục hoặc duyệt index của user rồi lọc @@
+        (
+            "search (owned)",
+            select(_ranked_notes(user_id, "owned", tsquery, limit)),
+            [("ix_notes_search_document", "ix_notes_user_active")],
+        ),
+        (
+            "search (all)",
+            select(_ranked_notes(user_id, "all", tsquery, limit)),
+            [("ix_notes_search_document", "ix_notes_user_active"), shares],
+        ),
+        ("suggest", _suggest_query(user_id, WORDS[0], 8), [("ix_notes_user_title_trgm",)]),
+        ("suggest (ngắn)", _suggest_query(user_id, WORDS[0][:2], 8), [("ix_notes_user_title_prefix",)]),
+        ("reminder claim", _claim_statement(now, 100, now + timedelta(minutes=5)), [("ix_notes_reminder_due",)]),
+        ("purge", _purge_batch_statement(now - timedelta(days=30), 100), [("ix_notes_trash_expiry",)]),
+    ]
+
+    failed = 0
+    async with engine.connect() as conn:
+        for name, statement, required in checks:
+            problems = check_plan(await explain(conn, statement), required)
+            if problems:
+                failed += 1
+                print(f"FAIL {name}: {'; '.join(problems)}")
+            else:
+                print(f"OK   {name}")
+    await engine.dispose()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Dữ liệu giả lập lớn cho benchmark và kiểm tra EXPLAIN
+
+Chỉ chạy trên database thử nghiệm (DATABASE_URL): user giả có email *@bench.invalid và script
+từ chối seed nếu database đã có user thật. Đã seed rồi thì dùng lại dữ liệu cũ.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import Base
+from app.migrations import create_extensions, run_migrations
+
+logger = logging.getLogger(__name__)
+
+BENCH_EMAIL_PATTERN = "%@bench.invalid"
+# Từ khóa xuất hiện đều trong tiêu đề/nội dung, dùng làm truy vấn search
+WORDS = ("alpha", "beta", "gamma", "delta", "hà nội", "sài gòn", "công việc", "du lịch")
+_WORDS_SQL = "ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "]"
+FOLDERS_PER_USER = 5
+
+
+async def prepare_schema(engine: AsyncEngine) -> None:
+    """Schema giống lúc app khởi động: extension, create_all, migrations (trigger search_document, index)"""
+    await create_extensions(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
+
+
+async def seed(engine: AsyncEngine, users: int, notes_per_user: int, share_every: int = 50) -> None:
+    """
+    Tạo `users` user, mỗi user FOLDERS_PER_USER folder và `notes_per_user` ghi chú (10% trong thùng rác,
+    5% có nhắc nhở, 2% được ghim, phần lớn nằm trong folder) và chia sẻ (đã chấp nhận) mỗi ghi chú
+    thứ `share_every` cho user kế tiếp
+    """
+    async with engine.begin() as conn:
+        real_users = await conn.scalar(
+            text("SELECT count(*) FROM users WHERE email NOT LIKE :pattern"), {"pattern": BENCH_EMAIL_PATTERN}
+        )
+        if real_users:
+            raise SystemExit("Database đã có user thật - chỉ chạy script trên database thử nghiệm")
+        if await conn.scalar(text("SELECT count(*) FROM users")):
+            logger.info("Dùng lại dữ liệu đã seed")
+            return
+
+        await conn.execute(
+            text(
+                "INSERT INTO users (username, email, hashed_password, created_at) "
+                "SELECT 'bench' || g, 'bench' || g || '@bench.invalid', 'x', now() FROM generate_series(1, :users) g"
+            ),
+            {"users": users},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO folders (name, user_id, created_at) "
+                "SELECT 'Folder ' || f, u.id, now() FROM users u CROSS JOIN generate_series(1, :folders) f"
+            ),
+            {"folders": FOLDERS_PER_USER},
+        )
+        await conn.execute(
+            text(
+                "WITH user_folders AS (SELECT user_id, array_agg(id ORDER BY id) AS ids FROM folders GROUP BY user_id) "
+                "INSERT INTO notes (title, content, is_markdown, folder_id, user_id, created_at, updated_at, "
+                "is_pinned, is_public, reminder_at, reminder_sent, color, deleted_at) "
+                f"SELECT 'Ghi chú ' || n || ' ' || ({_WORDS_SQL})[1 + n % {len(WORDS)}], "
+                f"repeat('nội dung mẫu ', 20) || ({_WORDS_SQL})[1 + (n * 7) % {len(WORDS)}] || ' ' || n, "
+                f"true, CASE WHEN n % {FOLDERS_PER_USER + 1} = 0 THEN NULL "
+                f"ELSE f.ids[n % {FOLDERS_PER_USER + 1}] END, "
+                "u.id, now() - n * interval '1 minute', now() - n * interval '1 minute', n % 50 = 0, false, "
+                "CASE WHEN n % 20 = 5 THEN now() + ((n % 2000) - 1000) * interval '1 minute' END, false, '#ffffff', "
+                "CASE WHEN n % 10 = 0 THEN now() - (n % 60) * interval '1 day' END "
+                "FROM users u JOIN user_folders f ON f.user_id = u.id "
+                "CROSS JOIN generate_series(1, :notes_per_user) AS n"
+            ),
+            {"notes_per_user": notes_per_user},
+        )
+        await conn.execute(
+            text(
+                "WITH bench AS (SELECT id, row_number() OVER (ORDER BY id) - 1 AS idx, count(*) OVER () AS total "
+                "FROM users) "
+                "INSERT INTO note_shares (note_id, shared_by_user_id, shared_with_user_id, status, created_at) "
+                "SELECT n.id, n.user_id, r.id, 'accepted', now() "
+                "FROM notes n JOIN bench o ON o.id = n.user_id JOIN bench r ON r.idx = (o.idx + 1) % o.total "
+                "WHERE n.id % :share_every = 0 AND o.total > 1"
+            ),
+            {"share_every": share_every},
+        )
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+    logger.info(f"Đã seed {users} user x {notes_per_user} ghi chú")
+
+
+async def sample_user_ids(engine: AsyncEngine, count: int) -> list:
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT id FROM users ORDER BY random() LIMIT :count"), {"count": count})
+        return [row.id for row in result]
@@ -19,6 +19,10 @@ const removeToken = () => {
   localStorage.removeItem('access_token');
 };
 
+// Thời điểm ghi cuối cùng do server trả về (X-Last-Write), gửi lại để các lần đọc ngay sau đó
+// không đi vào read replica còn trễ
+let lastWrite = null;
+
 // API request helper
 const apiRequest = async (endpoint, options = {}) => {
   const token = getToken();
@@ -30,11 +34,15 @@ const apiRequest = async (endpoint, options = {}) => {
   if (token) {
     headers['Authorization'] = `Bearer ${token}`;
   }
+  if (lastWrite) {
+    headers['X-Last-Write'] = lastWrite;
+  }
 
   const response = await fetch(`${API_URL}${endpoint}`, {
     ...options,
     headers,
   });
+  lastWrite = response.headers.get('X-Last-Write') || lastWrite;
 
   if (!response.ok) {
     const error = await response.json().catch(() => ({ detail: 'Có lỗi xảy ra' }));